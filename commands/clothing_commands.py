@@ -6,10 +6,13 @@ Commands describe the input the account can do to the game.
 
 """
 
+import re
 from evennia import default_cmds
-from evennia.commands.default.muxcommand import MuxCommand
+from commands.command import CachedCmdSetMixin, MuxCommand
 from evennia.utils import evtable
-from config.configlists import CLOTHING_MESSAGE_TYPES, NAKEDS_LIST
+from config.configlists import CLOTHING_MESSAGE_TYPES, STATE_MESSAGE_TYPES
+from world.bodyplans import body_plan_names, get_body_plan
+from world.broadcast import broadcast
 
 
 # Maximum character length of 'wear style' strings, or None for unlimited.
@@ -54,6 +57,10 @@ class CmdWear(MuxCommand):
         if clothing.db.worn and len(self.arglist) == 1:
             self.caller.msg("You're already wearing %s!" % clothing.name)
             return
+        misfits = clothing.get_misfits(self.caller.get_body_plan())
+        if misfits:
+            self.caller.msg("%s doesn't fit you, it covers: %s" % (clothing.name, ", ".join(misfits)))
+            return
         clothing.wear(self.caller)
 
 
@@ -81,17 +88,11 @@ class CmdRemove(MuxCommand):
         if not clothing.db.worn:
             self.caller.msg("You're not wearing that!")
             return
-        for covered in clothing.db.coverage:
-            worn = self.caller.db.worn
-            if worn[covered] and worn[covered][-1] != clothing:
+        worn = self.caller.get_worn()
+        for covered in clothing.get_coverage():
+            if covered in worn and worn[covered][-1] != clothing:
                 self.caller.msg("You need to remove %s first." % worn[covered][-1].name)
                 return
-        for covered in clothing.db.coverage:
-            worn = self.caller.db.worn
-            if len(worn[covered]) == 1:
-                worn[covered] = []
-            elif worn[covered]:
-                worn[covered].pop()
         clothing.remove(self.caller)
 
 
@@ -133,16 +134,17 @@ class CmdDrop(MuxCommand):
 
         obj.move_to(caller.location, quiet=True)
         caller.msg("You drop %s." % (obj.name,))
-        caller.location.msg_contents("%s drops %s." % (caller.name, obj.name), exclude=caller)
+        broadcast(caller.location, caller, "drops %s." % obj.name, exclude=caller)
         # Call the object script's at_drop() method.
         obj.at_drop(caller)
 
 
 class CmdToggle(MuxCommand):
     """
-    Toggle between a piece of clothing's two states.
+    Switch a piece of clothing to its next state, or to a named one.
     Usage:
         toggle <item>
+        toggle <item> = <state>
     """
 
     key = "toggle"
@@ -159,34 +161,101 @@ class CmdToggle(MuxCommand):
         if not clothing:
             self.caller.msg("Item must be clothing")
             return
-        if clothing.db.toggled:
-            wascovered = clothing.db.togglecoverage
-            nowcovered = clothing.db.coverage
-            for nakedwascovered in wascovered:
-                if nakedwascovered in nowcovered: #was covered while toggled, still covered
-                    continue
-                else: # old coverage is now no longer covered
-                    caller.db.worn[nakedwascovered].remove(clothing)
-            for newcovered in nowcovered:
-                if newcovered not in clothing.db.togglecoverage:
-                    caller.db.worn[newcovered].append(clothing)
-            clothing.db.toggled = False
-            caller.msg("%s %s " % ("You", clothing.db.messages['toggle2']))
-            caller.location.msg_contents("%s %s" % (caller.name, clothing.db.messages['otoggle2']), exclude=caller)
+        if self.rhs:
+            state = self.rhs.strip().lower()
+            if state not in clothing.get_states():
+                caller.msg("%s has no state %s. It has: %s" % (clothing.name, state,
+                                                                ", ".join(clothing.get_states())))
+                return
+            if state == clothing.get_state():
+                caller.msg("%s is already %s." % (clothing.name, state))
+                return
+        else:
+            state = clothing.get_next_state()
+        clothing.switch_state(caller, state)
+        messages = clothing.get_states()[state]["messages"]
+        caller.msg("%s %s" % ("You", messages.get("to", "")))
+        broadcast(caller.location, caller, messages.get("oto", ""), exclude=caller)
+
+
+class CmdState(MuxCommand):
+    """
+    Tailor the states a piece of clothing can be toggled between.
+    Usage:
+        @state <clothing item>                                : list its states
+        @state/add <clothing item>/<state>                    : add a state
+        @state/del <clothing item>/<state>                    : remove a state
+        @state/cover <clothing item>/<state> = <naked>        : add a naked (or group) the state covers
+        @state/uncover <clothing item>/<state> = <naked>      : remove a naked (or group) from the state
+        @state/msg <clothing item>/<state>/<type> = <message> : set a state message, type is one of
+                                                                to, oto (when switching to it) or worn
+    Examples:
+        @state/add hoodie/hood-up
+        @state/cover hoodie/hood-up = head
+        @state/msg hoodie/hood-up/oto = pulls up the hood of their hoodie.
+    Clothing starts with the states 'default' and 'toggled', which are the ones
+    the @coverage+, @togglecov+, @toggle1 etc. commands tailor.
+    """
+
+    key = "@state"
+    help_category = "tailoring"
+
+    def func(self):
+
+        caller = self.caller
+        if not self.args:
+            caller.msg("Usage: @state[/switch] <clothing item>[/<state>] [= <value>]")
+            return
+        parts = [part.strip() for part in self.lhs.split("/")]
+        clothing = self.caller.search(parts[0], candidates=self.caller.contents)
+        if not clothing:
+            self.caller.msg("Thing to tailor must be carried or worn.")
+            return
+        state = parts[1].lower() if len(parts) > 1 else None
+        if not self.switches:
+            string = "States for %s (now %s):\n" % (clothing.name, clothing.get_state())
+            for name, definition in clothing.get_states().items():
+                string += "|w%s|n covers: %s\n" % (name, ", ".join(definition["coverage"]) or "nothing")
+                for message_type in STATE_MESSAGE_TYPES:
+                    string += "  %s: %s\n" % (message_type, definition["messages"].get(message_type, ""))
+            caller.msg(string)
+            return
+        if not state or not re.match(r"^[\w-]+$", state):
+            caller.msg("Need to provide a state name (letters, numbers, - and _).")
+            return
+        switch = self.switches[0]
+        if switch == "add":
+            clothing.add_state(state)
+            caller.msg("Added state %s to %s." % (state, clothing.name))
+            return
+        if state not in clothing.get_states():
+            caller.msg("%s has no state %s." % (clothing.name, state))
+            return
+        if switch == "del":
+            if clothing.remove_state(state):
+                caller.msg("Removed state %s from %s." % (state, clothing.name))
+            else:
+                caller.msg("%s needs at least one state." % clothing.name)
+        elif switch in ("cover", "uncover"):
+            regions = clothing.get_body_plan().expand((self.rhs or "").strip().lower())
+            if not regions:
+                caller.msg("%s is not a naked area or group. " % self.rhs)
+                return
+            if switch == "cover":
+                clothing.add_coverage(regions, state=state)
+            else:
+                clothing.remove_coverage(regions, state=state)
+            caller.msg("State %s of %s now covers: %s" % (state, clothing.name,
+                                                         ", ".join(clothing.get_states()[state]["coverage"]) or "nothing"))
+        elif switch == "msg":
+            message_type = parts[2].lower() if len(parts) > 2 else None
+            if message_type not in STATE_MESSAGE_TYPES:
+                caller.msg("Message type must be one of: %s" % ", ".join(STATE_MESSAGE_TYPES))
+                return
+            clothing.set_state_message(state, message_type, self.rhs or "")
+            caller.msg("%s message for %s of %s set as: %s" % (message_type, state, clothing.name, self.rhs or ""))
         else:
-            togglecoverage = clothing.db.togglecoverage
-            oldcoverage = clothing.db.coverage
-            for oldcovered in oldcoverage:
-                if oldcovered in togglecoverage:
-                    continue
-                else: # old coverage is now no longer covered
-                    caller.db.worn[oldcovered].remove(clothing)
-            for newcovered in togglecoverage:
-                if newcovered not in clothing.db.coverage:
-                    caller.db.worn[newcovered].append(clothing)
-            clothing.db.toggled = True
-            caller.msg("%s %s" % ("You", clothing.db.messages['toggle1']))
-            caller.location.msg_contents("%s %s" % (caller.name, clothing.db.messages['otoggle1']), exclude=caller)
+            caller.msg("Unknown switch /%s." % switch)
 
 
 class CmdSetWorn(MuxCommand):
@@ -212,7 +281,7 @@ class CmdSetWorn(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['worn'] = self.rhs
+                clothing.set_message('worn', self.rhs)
                 caller.msg("Worn message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -239,7 +308,7 @@ class CmdSetWear(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['wear'] = self.rhs
+                clothing.set_message('wear', self.rhs)
                 caller.msg("Wear message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -266,7 +335,7 @@ class CmdSetOwear(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['owear'] = self.rhs
+                clothing.set_message('owear', self.rhs)
                 caller.msg("owear message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -293,7 +362,7 @@ class CmdSetRemove(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['remove'] = self.rhs
+                clothing.set_message('remove', self.rhs)
                 caller.msg("Remove message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -320,7 +389,7 @@ class CmdSetOremove(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['oremove'] = self.rhs
+                clothing.set_message('oremove', self.rhs)
                 caller.msg("oremove message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -347,7 +416,7 @@ class CmdSetTease(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['tease'] = self.rhs
+                clothing.set_message('tease', self.rhs)
                 caller.msg("tease message for %s set." % clothing.name)
 
 
@@ -374,7 +443,7 @@ class CmdSetOtease(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['otease'] = self.rhs
+                clothing.set_message('otease', self.rhs)
                 caller.msg("otease message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -401,7 +470,7 @@ class CmdSetToggle1(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['toggle1'] = self.rhs
+                clothing.set_message('toggle1', self.rhs)
                 caller.msg("toggle1 message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -428,7 +497,7 @@ class CmdSetToggle2(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['toggle2'] = self.rhs
+                clothing.set_message('toggle2', self.rhs)
                 caller.msg("toggle2 message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -455,7 +524,7 @@ class CmdSetOtoggle1(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['otoggle1'] = self.rhs
+                clothing.set_message('otoggle1', self.rhs)
                 caller.msg("otoggle1 message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -482,7 +551,7 @@ class CmdSetOtoggle2(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['otoggle2'] = self.rhs
+                clothing.set_message('otoggle2', self.rhs)
                 caller.msg("otoggle2 message for %s set as: %s" % (clothing.name, self.rhs))
 
 
@@ -509,13 +578,13 @@ class CmdSetWornToggled(MuxCommand):
                 self.caller.msg("Thing to set message for must be carried or worn.")
                 return
             if self.rhs:
-                clothing.db.messages['worntoggled'] = self.rhs
+                clothing.set_message('worntoggled', self.rhs)
                 caller.msg("worntoggled message for %s set as: %s" % (clothing.name, self.rhs))
 
 
 class CmdCoveragePlus(MuxCommand):
     """
-    Add a naked covered by a piece of clothing.
+    Add a naked (or a group of nakeds, like 'arms') covered by a piece of clothing.
     Usage:
         @coverage+ <clothing item> = <naked>
     """
@@ -535,16 +604,17 @@ class CmdCoveragePlus(MuxCommand):
                 self.caller.msg("thing to add coverage to must be carried")
                 return
             if self.rhs:
-                if self.rhs not in NAKEDS_LIST:
-                    self.caller.msg("%s is not a naked area. " % self.rhs)
+                regions = clothing.get_body_plan().expand(self.rhs.strip().lower())
+                if not regions:
+                    self.caller.msg("%s is not a naked area or group. " % self.rhs)
                     return
-                clothing.db.coverage.append(self.rhs.strip().lower())
+                clothing.add_coverage(regions)
                 caller.msg("Added coverage %s for %s" % (self.rhs, clothing.name))
 
 
 class CmdCoverageMinus(MuxCommand):
     """
-    Remove a naked covered by a piece of clothing.
+    Remove a naked (or a group of nakeds, like 'arms') covered by a piece of clothing.
     Usage:
         @coverage- <clothing item> = <naked>
     """
@@ -564,17 +634,18 @@ class CmdCoverageMinus(MuxCommand):
                 self.caller.msg("thing to remove coverage to must be carried")
                 return
             if self.rhs:
-                if self.rhs not in NAKEDS_LIST:
-                    self.caller.msg("%s is not a naked area. " % self.rhs)
+                regions = clothing.get_body_plan().expand(self.rhs.strip().lower())
+                if not regions:
+                    self.caller.msg("%s is not a naked area or group. " % self.rhs)
                     return
-                clothing.db.coverage.remove(self.rhs.strip().lower())
+                clothing.remove_coverage(regions)
                 caller.msg("Remove coverage %s for %s" % (self.rhs, clothing.name))
 
 
 
 class CmdToggleCoveragePlus(MuxCommand):
     """
-    Add a naked covered by a piece of clothing when it's otggled.
+    Add a naked (or a group of nakeds) covered by a piece of clothing when it's toggled.
     Usage:
         @togglecov+ <clothing item> = <naked>
     """
@@ -594,16 +665,17 @@ class CmdToggleCoveragePlus(MuxCommand):
                 self.caller.msg("thing to add coverage to must be carried")
                 return
             if self.rhs:
-                if self.rhs not in NAKEDS_LIST:
-                    self.caller.msg("%s is not a naked area. " % self.rhs)
+                regions = clothing.get_body_plan().expand(self.rhs.strip().lower())
+                if not regions:
+                    self.caller.msg("%s is not a naked area or group. " % self.rhs)
                     return
-                clothing.db.togglecoverage.append(self.rhs.strip().lower())
+                clothing.add_coverage(regions, toggled=True)
                 caller.msg("Added toggle coverage %s for %s" % (self.rhs, clothing.name))
 
 
 class CmdToggleCoverageMinus(MuxCommand):
     """
-    Remove a naked covered by a piece of clothing when it's toggled.
+    Remove a naked (or a group of nakeds) covered by a piece of clothing when it's toggled.
     Usage:
         @togglecov- <clothing item> = <naked>
     """
@@ -623,10 +695,11 @@ class CmdToggleCoverageMinus(MuxCommand):
                 self.caller.msg("thing to remove coverage to must be carried")
                 return
             if self.rhs:
-                if self.rhs not in NAKEDS_LIST:
-                    self.caller.msg("%s is not a naked area. " % self.rhs)
+                regions = clothing.get_body_plan().expand(self.rhs.strip().lower())
+                if not regions:
+                    self.caller.msg("%s is not a naked area or group. " % self.rhs)
                     return
-                clothing.db.togglecoverage.remove(self.rhs.strip().lower())
+                clothing.remove_coverage(regions, toggled=True)
                 caller.msg("Remove toggled coverage %s for %s" % (self.rhs, clothing.name))
 
 
@@ -651,8 +724,8 @@ class CmdMessages(MuxCommand):
             self.caller.msg("Thing to view messages for must be clothing.")
             return
         message_string = ""
-        for message_name, message in clothing.db.messages.items():
-            message_string += "%s: %s\n" % (message_name, message)
+        for message_name in CLOTHING_MESSAGE_TYPES:
+            message_string += "%s: %s\n" % (message_name, clothing.get_message(message_name))
         caller.msg("Messages for %s:\n%s" % (clothing.name, message_string))
 
 
@@ -764,10 +837,51 @@ class CmdSeethru(MuxCommand):
         if not clothing:
             self.caller.msg("Target must be clothing.")
             return
-        clothing.db.seethru = not clothing.db.seethru
-        caller.msg("See-through for %s set to %s" % (clothing.name, clothing.db.seethru))
+        seethru = not clothing.get_attribute("seethru")
+        clothing.set_attribute("seethru", seethru)
+        caller.msg("See-through for %s set to %s" % (clothing.name, seethru))
+
+class CmdFit(MuxCommand):
+    """
+    Set the body plan a piece of clothing is cut for. Its coverage is
+    tailored against that plan, and only characters with the regions it
+    covers can wear it. Clothing starts out cut for the default plan.
+    Usage:
+        @fit <clothing item>             : show the plan it is cut for
+        @fit <clothing item> = <plan>    : cut it for another plan
+    """
+
+    key = "@fit"
+    help_category = "tailoring"
+
+    def func(self):
+
+        caller = self.caller
+        if not self.args:
+            caller.msg("Usage: @fit <clothing item> [= <plan>]")
+            return
+        clothing = self.caller.search(self.lhs, candidates=self.caller.contents)
+        if not clothing:
+            self.caller.msg("Thing to fit must be carried.")
+            return
+        if not self.rhs:
+            caller.msg("%s is cut for the %s body plan." % (clothing.name, clothing.get_body_plan().name))
+            return
+        plan = self.rhs.strip().lower()
+        if plan not in body_plan_names():
+            caller.msg("Body plan must be one of: %s" % ", ".join(body_plan_names()))
+            return
+        if clothing.db.worn:
+            caller.msg("Take %s off first." % clothing.name)
+            return
+        misfits = clothing.get_misfits(get_body_plan(plan))
+        if misfits:
+            caller.msg("The %s body plan has no %s; uncover them first." % (plan, ", ".join(misfits)))
+            return
+        clothing.set_attribute("body_plan", plan)
+        caller.msg("%s is now cut for the %s body plan." % (clothing.name, plan))
 
-class ClothedCharacterCmdSet(default_cmds.CharacterCmdSet):
+class ClothedCharacterCmdSet(CachedCmdSetMixin, default_cmds.CharacterCmdSet):
     """
     Command set for clothing, including new versions of 'give' and 'drop'
     that take worn and covered clothing into account, as well as a new
@@ -808,7 +922,9 @@ class ClothedCharacterCmdSet(default_cmds.CharacterCmdSet):
         self.add(CmdSetOtease())
         self.add(CmdMessages())
         self.add(CmdToggle())
+        self.add(CmdState())
         self.add(CmdSeethru())
+        self.add(CmdFit())
 
     pass
 
@@ -5,12 +5,37 @@ Commands describe the input the account can do to the game.
 
 """
 
+import re
+from copy import copy
 from evennia import Command as BaseCommand
 from evennia import create_object
-from evennia.commands.default.muxcommand import MuxCommand
+from evennia.commands.default.muxcommand import MuxCommand as BaseMuxCommand
+from evennia.utils import evtable
+from world.bodyplans import body_plan_names, get_body_plan
+from world.broadcast import broadcast
+from world import behavior
+from world import metrics
+from world import npcs
+from world import presence
 
 
-class Command(BaseCommand):
+class InstrumentedCommandMixin(object):
+    """
+    Times commands and counts their database queries when @perf timing
+    is on (see world/metrics.py). Subclasses overriding at_pre_cmd or
+    at_post_cmd must call super().
+    """
+
+    def at_pre_cmd(self):
+        metrics.command_started(self)
+        return super().at_pre_cmd()
+
+    def at_post_cmd(self):
+        super().at_post_cmd()
+        metrics.command_finished(self)
+
+
+class Command(InstrumentedCommandMixin, BaseCommand):
     """
     Inherit from this if you want to create your own command styles
     from scratch.  Note that Evennia's default commands inherits from
@@ -34,11 +59,66 @@ class Command(BaseCommand):
     pass
 
 
+class MuxCommand(InstrumentedCommandMixin, BaseMuxCommand):
+    """
+    Evennia's MuxCommand, timed like `Command`. The game's MuxCommand-style
+    commands (including the clothing commands) inherit from this.
+    """
+
+    pass
+
+
+# {cmdset class: (commands, {key or alias: index})}, see CachedCmdSetMixin.
+# Lives in memory, so a @reload picks up changed cmdsets.
+_CMDSET_CACHE = {}
+
+
+class CachedCmdSetMixin(object):
+    """
+    Assembles a cmdset's commands once per cmdset class. Every character
+    and NPC gets its own instance of its cmdsets, and at_cmdset_creation
+    used to instantiate and merge every command (including nested sets,
+    and their own defaults) for each of them. Now only the first instance
+    does; the others get shallow copies of its commands, which share
+    their match tables but keep their own `obj`, their own lockhandler
+    and anything set while running.
+
+    Mix in before the Evennia cmdset, like InstrumentedCommandMixin.
+    """
+
+    def at_cmdset_creation(self):
+        commands = _CMDSET_CACHE.get(type(self))
+        if commands is None:
+            super().at_cmdset_creation()
+            commands = _CMDSET_CACHE[type(self)] = [_copy_command(cmd) for cmd in self.commands]
+            for cmd in commands:
+                cmd.obj = None
+        self.commands = [_copy_command(cmd) for cmd in commands]
+        for cmd in self.commands:
+            cmd.obj = self.cmdsetobj
+        self.system_commands = [cmd for cmd in self.commands if cmd.key.startswith("__")]
+
+
+def _copy_command(cmd):
+    """
+    Shallow copy of a command. The lockhandler is a lazy property cached
+    on the instance, and its `obj` would still be the original command,
+    so it is dropped and rebuilt for the copy when first needed.
+    """
+    copied = copy(cmd)
+    copied.__dict__.pop("lockhandler", None)
+    return copied
+
+
 class CmdCreateNpc(Command):
     """
-    Create a new npc.
+    Create new npcs.
     Usage:
         @createnpc <NPC name>
+        @createnpc <count> <template>
+
+    The second form creates a whole crowd at once from a prototype (see
+    world/prototypes.py), numbered like "Extra 1", "Extra 2" and so on.
     """
 
     key = "@createnpc"
@@ -49,45 +129,164 @@ class CmdCreateNpc(Command):
     def func(self):
         caller = self.caller
         if not self.args:
-            caller.msg("Usage: @createnpc: <name>")
+            caller.msg("Usage: @createnpc: <name> or @createnpc <count> <template>")
+            return
+        match = re.match(r"^\s*(\d+)\s+(.+)$", self.args)
+        if match:
+            self.spawn(int(match.group(1)), match.group(2).strip())
             return
         name = self.args.strip().capitalize()
-        npc = create_object("characters.Character", key=name, location=caller.location,
-                            locks="edit:id(%i) and perm(Builders);call:false();npc:true()" % caller.id)
-        message = "%s created the NPC '%s'."
-        caller.msg(message % ("You", name))
-        caller.location.msg_contents(message % (caller.key, name), exclude=caller)
+        npc = create_object(npcs.NPC_TYPECLASS, key=name, location=caller.location,
+                            locks=npcs.NPC_LOCKS % caller.id)
+        caller.msg("You created the NPC '%s'." % name)
+        broadcast(caller.location, caller, "created the NPC '%s'." % name, exclude=caller)
 
+    def spawn(self, count, template):
+        caller = self.caller
+        if not 0 < count <= npcs.MAX_SPAWN:
+            caller.msg("You can create between 1 and %i NPCs at once." % npcs.MAX_SPAWN)
+            return
+        prototype = npcs.find_template(template)
+        if not prototype:
+            caller.msg("There is no NPC template called '%s'." % template)
+            return
+        created = npcs.spawn_npcs(prototype, count, caller.location, caller)
+        if count == 1:
+            names = "the NPC '%s'" % created[0].key
+        else:
+            names = "%i NPCs, %s to %s" % (count, created[0].key, created[-1].key)
+        caller.msg("You created %s." % names)
+        broadcast(caller.location, caller, "created %s." % names, exclude=caller)
 
-class CmdNpc(Command):
+
+class CmdNpc(MuxCommand):
     """
-    Tell an NPC to perform an action without puppeting them.
+    Tell NPCs to perform actions without puppeting them.
     Usage:
-        @npc <npc name> = <action>
+        @npc <npc name>[, <npc name>...] = <action>
+        @npc/seq <npc names> = <action>; wait <seconds>; <action>...
+        @npc/group <group> = <npc name>[, <npc name>...]
+        @npc/ungroup <group>
+        @npc/groups
+        @npc/clear
+        @npc/idle <npc names> = [<seconds>:] <action>; <action>...
+        @npc/idle <npc names> =
+
+    Instead of NPC names you can use the name of one of your groups. Orders
+    are queued and run in the order given; in a /seq, "wait <seconds>"
+    pauses before the next action. Everything the NPCs do between two waits
+    reaches the room at once. /clear drops the orders that haven't run yet.
+
+    /idle gives NPCs actions they pick from by themselves every so often
+    (every <seconds> on average, 120 if not given) while someone is around
+    to see. Leave the actions out to stop them.
     """
-    
+
     key = "@npc"
     locks = "call:not perm(nonpcs)"
     help_category = "gm"
 
-    def parse(self):
-        name, cmdname = None, None
-        if "=" in self.args:
-            name, cmdname = [part.strip() for part in self.args.rsplit("=")]
-        self.name, self.cmdname = name, cmdname
-
     def func(self):
         caller = self.caller
-        if not self.cmdname:
+        if "groups" in self.switches:
+            self.list_groups()
+        elif "group" in self.switches:
+            self.set_group()
+        elif "ungroup" in self.switches:
+            self.remove_group()
+        elif "clear" in self.switches:
+            caller.msg("You dropped %i queued NPC orders." % npcs.clear_orders(caller))
+        elif "idle" in self.switches:
+            self.set_idle()
+        else:
+            self.order()
+
+    def order(self):
+        caller = self.caller
+        if not self.rhs or not self.lhslist:
             caller.msg("Usage: @npc <name> = <command>")
-        npc = caller.search(self.name)
-        if not npc:
             return
-        if not npc.access(caller, "edit"):
-            caller.msg("You may not order this npc to do anything.")
+        if "seq" in self.switches:
+            steps = npcs.parse_sequence(self.rhs)
+        else:
+            steps = [("cmd", self.rhs.strip())]
+        if not steps:
+            caller.msg("Usage: @npc/seq <names> = <command>; wait <seconds>; <command>")
+            return
+        allowed, refused = npcs.resolve_targets(caller, self.lhslist)
+        if refused:
+            caller.msg("You may not order %s to do anything." % ", ".join(npc.key for npc in refused))
+        if not allowed:
+            return
+        names = ", ".join(npc.key for npc in allowed)
+        if len(steps) == 1:
+            caller.msg("You told %s to do '%s'." % (names, steps[0][1]))
+        else:
+            caller.msg("You gave %s a sequence of %i steps." % (names, len(steps)))
+        npcs.queue_orders(caller, allowed, steps)
+
+    def set_idle(self):
+        caller = self.caller
+        if not self.lhslist or self.rhs is None:
+            caller.msg("Usage: @npc/idle <names> = [<seconds>:] <action>; <action>...")
+            return
+        allowed, refused = npcs.resolve_targets(caller, self.lhslist)
+        if refused:
+            caller.msg("You may not order %s to do anything." % ", ".join(npc.key for npc in refused))
+        if not allowed:
+            return
+        interval = None
+        match = re.match(r"^\s*(\d+)\s*:(.*)$", self.rhs)
+        text = self.rhs
+        if match:
+            interval, text = int(match.group(1)), match.group(2)
+        actions = [action.strip() for action in text.split(";") if action.strip()]
+        names = ", ".join(npc.key for npc in allowed)
+        for npc in allowed:
+            npcs.touch(npc)
+            behavior.set_idle_actions(npc, actions, interval)
+        if actions:
+            caller.msg("%s will now idle with %i action%s." % (names, len(actions), "" if len(actions) == 1 else "s"))
+        else:
+            caller.msg("%s will no longer do anything by themselves." % names)
+
+    def list_groups(self):
+        caller = self.caller
+        groups = caller.get_attribute("npc_groups")
+        if not groups:
+            caller.msg("You have no NPC groups.")
             return
-        npc.execute_cmd(self.cmdname)
-        caller.msg("You told %s to do '%s'." % (npc.key, self.cmdname))
+        table = evtable.EvTable("Group", "NPCs", border="cells")
+        for name, members in sorted(groups.items()):
+            table.add_row(name, ", ".join(npc.key for npc in members if npc))
+        caller.msg(str(table))
+
+    def set_group(self):
+        caller = self.caller
+        group = self.lhs.strip().lower()
+        if not group or not self.rhslist:
+            caller.msg("Usage: @npc/group <group> = <npc name>[, <npc name>...]")
+            return
+        members, refused = npcs.resolve_targets(caller, self.rhslist)
+        if refused:
+            caller.msg("You may not order %s to do anything." % ", ".join(npc.key for npc in refused))
+        if not members:
+            return
+        groups = dict(caller.get_attribute("npc_groups"))
+        groups[group] = members
+        caller.set_attribute("npc_groups", groups)
+        caller.msg("Group '%s' is now %s." % (group, ", ".join(npc.key for npc in members)))
+
+    def remove_group(self):
+        caller = self.caller
+        group = self.args.strip().lower()
+        groups = dict(caller.get_attribute("npc_groups"))
+        if group not in groups:
+            caller.msg("You have no NPC group called '%s'." % group)
+            return
+        del groups[group]
+        caller.set_attribute("npc_groups", groups)
+        caller.msg("You removed the group '%s'." % group)
 
 
 class CmdClothing(MuxCommand):
@@ -107,9 +306,8 @@ class CmdClothing(MuxCommand):
         name = self.args
         clothing = create_object("clothing.Clothing", key=name, location=caller,
                                  locks="edit:id(%i) and perm(Builders);call:false()" % caller.id)
-        message = "%s created '%s'."
-        caller.msg(message % ("You", name))
-        caller.location.msg_contents(message % (caller.key, name), exclude=caller)
+        caller.msg("You created '%s'." % name)
+        broadcast(caller.location, caller, "created '%s'." % name, exclude=caller)
 
 
 class CmdChar(MuxCommand):
@@ -120,12 +318,16 @@ class CmdChar(MuxCommand):
     Usage:
 
         @char nakeds                             : List nakeds
-        @char <naked part> = <description>       : Assign/overwrite naked
+        @char nakeds = <block>                   : Set many nakeds at once, one '<naked part>: <description>'
+                                                   per line (or separated by |/). An empty description clears.
+        @char <naked part> = <description>       : Assign/overwrite naked. A group of parts, like 'arms', sets them all.
         @char <naked part> =                     : clear naked for this part
         @char idle = <idle pose>                 : Set your idle pose (what players see when they look at a room you're in)
-        @char temp-idle = <idle pose>            : Set your temp-idle pose (same as idle, but clears when you move rooms)
+        @char temp-idle = <idle pose>            : Set your temp-idle pose (same as idle, but clears when you move rooms or after 30 minutes idle)
         @char sleep-idle = <idle pose>           : Set your sleep-idle pose (what players see when you're logged out)
         @char skintone = <skintone code>         : Set your skintone, which colors your nakeds. Use 'color xterm256' to see options.
+        @char bodyplan = <plan>                  : Set your body plan, which decides your naked parts. '@char bodyplan' lists plans.
+        @char brief = on|off                     : Only see the room name, exits and occupant count when you move. 'look' still shows everything.
 
     """
 
@@ -136,37 +338,120 @@ class CmdChar(MuxCommand):
     def func(self):
 
         caller = self.caller
+        if npcs.is_npc(caller):
+            npcs.touch(caller)
         args = self.args.strip()
 
         if args.lower() == "nakeds" and not self.rhs:
             nakeds_string = ''
-            for key, value in caller.db.nakeds.items():
-                nakeds_string += ("%s: %s%s|n\n" % (key, caller.db.skintone, value))
+            skintone = caller.get_attribute("skintone")
+            for key, value in caller.get_nakeds().items():
+                nakeds_string += ("%s: %s%s|n\n" % (key, skintone, value))
             caller.msg("\nNaked descriptions:\n\n%s" % nakeds_string)
         elif self.lhs:
             key = self.lhs.strip().lower()
-            if key in caller.db.nakeds:
+            plan = caller.get_body_plan()
+            regions = plan.expand(key)
+            if regions:
+                caller.set_nakeds({naked: self.rhs or "" for naked in regions})
                 if self.rhs:
-                    caller.db.nakeds[key] = self.rhs
                     caller.msg("Naked description for %s set." % key)
                 else:
-                    caller.db.nakeds[key] = ""
                     caller.msg("Naked description for %s cleared." % key)
+            elif key == "nakeds":
+                nakeds = {}
+                for line in re.split(r"\n|\|/", self.rhs):
+                    if not line.strip():
+                        continue
+                    naked, sep, description = line.partition(":")
+                    naked = naked.strip().lower()
+                    if not sep or naked not in plan:
+                        caller.msg("%s is not a naked area. Use '<naked part>: <description>'." % naked)
+                        return
+                    nakeds[naked] = description.strip()
+                changed = caller.set_nakeds(nakeds)
+                caller.msg("Naked descriptions updated for %i part%s." % (changed, "" if changed == 1 else "s"))
             elif key == "idle":
-                caller.db.idlepose = self.rhs
+                if caller.set_attribute("idlepose", self.rhs):
+                    presence.emit(caller.location, "pose", caller)
                 caller.msg("Your idle pose is now '%s %s'" % (caller.key, self.rhs))
             elif key == "temp-idle":
-                caller.db.temp_idlepose = self.rhs
+                if caller.set_attribute("temp_idlepose", self.rhs):
+                    presence.emit(caller.location, "pose", caller)
                 caller.msg("Your temp-idle pose is now '%s %s'" % (caller.key, self.rhs))
             elif key == "sleep-idle":
-                caller.db.sleep_idlepose = self.rhs
+                caller.set_attribute("sleep_idlepose", self.rhs)
                 caller.msg("Your sleep-idle pose is now '%s %s'" % (caller.key, self.rhs))
             elif key == "skintone":
-                caller.db.skintone = self.rhs
+                caller.set_attribute("skintone", self.rhs)
                 caller.msg("You set your skintone to %s" % self.rhs)
+            elif key == "bodyplan":
+                if not self.rhs or self.rhs.strip().lower() not in body_plan_names():
+                    caller.msg("Body plans: %s" % ", ".join(body_plan_names()))
+                    return
+                plan = get_body_plan(self.rhs.strip().lower())
+                worn = []
+                for items in caller.get_worn().values():
+                    worn.extend(item for item in items if item not in worn)
+                misfits = [item.name for item in worn if item.get_misfits(plan)]
+                if misfits:
+                    caller.msg("The %s body plan doesn't fit what you're wearing; take off %s first."
+                               % (plan.name, ", ".join(misfits)))
+                    return
+                caller.set_attribute("body_plan", plan.name)
+                caller.msg("Your body plan is now %s." % plan.name)
+            elif key == "brief":
+                if not self.rhs or self.rhs.strip().lower() not in ("on", "off"):
+                    caller.msg("Usage: @char brief = on|off")
+                    return
+                caller.db.brief = self.rhs.strip().lower() == "on"
+                caller.msg("Brief mode is now %s." % ("on" if caller.db.brief else "off"))
             else:
                 caller.msg("No corresponding @char command for %s." % key)
 
+class CmdPerf(MuxCommand):
+    """
+    Show which commands are slowest.
+    Usage:
+        @perf [<count>]          : top commands by 95th percentile latency
+        @perf/sort <key> [count] : sort by p50, p95, p99, max, total or queries
+        @perf/on                 : start timing commands
+        @perf/off                : stop timing commands
+        @perf/reset              : forget all timings
+    Latencies are in milliseconds, estimated from a histogram. Queries
+    are database queries per call.
+    """
+
+    key = "@perf"
+    locks = "cmd:perm(Admin)"
+    help_category = "admin"
+
+    def func(self):
+        caller = self.caller
+        if "on" in self.switches or "off" in self.switches:
+            metrics.set_perf_enabled("on" in self.switches)
+            caller.msg("Command timing is now %s." % ("on" if metrics.perf_enabled() else "off"))
+            return
+        if "reset" in self.switches:
+            metrics.reset_commands()
+            caller.msg("Command timings reset.")
+            return
+        args = self.args.split()
+        sort = "p95"
+        if "sort" in self.switches:
+            if not args or args[0] not in ("p50", "p95", "p99", "max", "total", "queries"):
+                caller.msg("Sort by one of p50, p95, p99, max, total or queries.")
+                return
+            sort = args.pop(0)
+        count = int(args[0]) if args and args[0].isdigit() else 10
+        table = evtable.EvTable("command", "calls", "p50", "p95", "p99", "max", "queries", "max q", border="header")
+        for stats in metrics.top_commands(count, sort):
+            table.add_row(stats.key, stats.calls, "%.1f" % stats.percentile(0.5), "%.1f" % stats.percentile(0.95),
+                          "%.1f" % stats.percentile(0.99), "%.1f" % stats.max_ms, "%.1f" % stats.mean_queries,
+                          stats.max_queries)
+        state = "on" if metrics.perf_enabled() else "off (@perf/on to start)"
+        caller.msg("|wCommand timing is %s. Sorted by %s:|n\n%s" % (state, sort, table))
+
 # -------------------------------------------------------------
 #
 # The default commands inherit from
@@ -19,11 +19,13 @@ from commands import command
 from commands import clothing_commands
 
 
-class CharacterCmdSet(default_cmds.CharacterCmdSet):
+class CharacterCmdSet(command.CachedCmdSetMixin, default_cmds.CharacterCmdSet):
     """
     The `CharacterCmdSet` contains general in-game commands like `look`,
     `get`, etc available on in-game Character objects. It is merged with
     the `AccountCmdSet` when an Account puppets a Character.
+
+    It is only assembled once, see `commands.command.CachedCmdSetMixin`.
     """
 
     key = "DefaultCharacter"
@@ -41,6 +43,7 @@ class CharacterCmdSet(default_cmds.CharacterCmdSet):
         self.add(clothing_commands.ClothedCharacterCmdSet())
         self.add(command.CmdChar())
         self.add(command.CmdClothing())
+        self.add(command.CmdPerf())
 
 
 class AccountCmdSet(default_cmds.AccountCmdSet):
@@ -6,10 +6,68 @@ NAKEDS_LIST = ['head', 'left-eye', 'right-eye', 'face', 'neck', 'left-shoulder',
                'abdomen', 'groin', 'butt', 'left-thigh', 'right-thigh', 'left-calf', 'right-calf',
                'left-foot', 'right-foot']
 
+# Body plans characters can have. Each plan lists its regions in description order,
+# named groups of regions (a group may also name other groups) and the regions that
+# start a new paragraph in descriptions. A plan with a 'parent' starts from a copy of
+# that plan, adds its 'extra_regions' and merges in its own groups. Plans are compiled
+# into lookup tables at startup by world/bodyplans.py.
+BODY_PLANS = {
+    'human': {
+        'regions': NAKEDS_LIST,
+        'groups': {
+            'eyes': ['left-eye', 'right-eye'],
+            'shoulders': ['left-shoulder', 'right-shoulder'],
+            'upperarms': ['left-upperarm', 'right-upperarm'],
+            'forearms': ['left-forearm', 'right-forearm'],
+            'arms': ['upperarms', 'forearms'],
+            'hands': ['left-hand', 'right-hand'],
+            'torso': ['chest', 'back', 'abdomen'],
+            'thighs': ['left-thigh', 'right-thigh'],
+            'calves': ['left-calf', 'right-calf'],
+            'legs': ['thighs', 'calves'],
+            'feet': ['left-foot', 'right-foot'],
+        },
+        'paragraphs': ['head', 'left-shoulder', 'groin'],
+    },
+    'cyborg': {
+        'parent': 'human',
+        'extra_regions': ['neural-port', 'spine-jack', 'left-arm-chassis', 'right-arm-chassis'],
+        'groups': {
+            'chassis': ['left-arm-chassis', 'right-arm-chassis'],
+            'ports': ['neural-port', 'spine-jack'],
+        },
+    },
+    'quadruped': {
+        'regions': ['head', 'left-eye', 'right-eye', 'muzzle', 'left-ear', 'right-ear', 'neck',
+                    'chest', 'back', 'left-flank', 'right-flank', 'belly',
+                    'left-foreleg', 'right-foreleg', 'left-forepaw', 'right-forepaw',
+                    'left-hindleg', 'right-hindleg', 'left-hindpaw', 'right-hindpaw',
+                    'groin', 'tail'],
+        'groups': {
+            'eyes': ['left-eye', 'right-eye'],
+            'ears': ['left-ear', 'right-ear'],
+            'flanks': ['left-flank', 'right-flank'],
+            'torso': ['chest', 'back', 'flanks', 'belly'],
+            'forelegs': ['left-foreleg', 'right-foreleg'],
+            'hindlegs': ['left-hindleg', 'right-hindleg'],
+            'legs': ['forelegs', 'hindlegs'],
+            'paws': ['left-forepaw', 'right-forepaw', 'left-hindpaw', 'right-hindpaw'],
+        },
+        'paragraphs': ['head', 'chest', 'groin'],
+    },
+}
+
+# The body plan characters get unless they pick another one
+DEFAULT_BODY_PLAN = 'human'
+
 # The different types of clothing messages
 CLOTHING_MESSAGE_TYPES = ['wear', 'owear', 'remove', 'oremove', 'toggle1', 'otoggle1', 'toggle2', 'otoggle2',
                           'worn', 'worntoggled', 'tease', 'otease', 'dtease']
 
+# The messages each clothing state has: 'to' and 'oto' are shown to the wearer and the
+# room when switching to the state, 'worn' in the wearer's description while in it
+STATE_MESSAGE_TYPES = ['to', 'oto', 'worn']
+
 # These are ambience strings for indoor rooms in the Dirge sector
 DIRGE_INDOOR_AMBIENCE_STRINGS = (
     "Off in the distance, the sirens of a private police-force wail, rising and fading.",
@@ -23,7 +23,225 @@ line to your settings file:
 
     SEARCH_AT_RESULT = "server.conf.at_search.at_search_result"
 
+(which this game does). Multiple matches are ranked before they are
+listed: exact name matches first, then what the searcher wears, then
+what they carry, then the rest, and within each of those the things
+they picked most recently. If exactly one match is exact, it is used
+without asking.
+
+The last list of multiple matches is remembered per session, so the
+searcher can answer with just its number ("wear 2") and
+`Character.search` picks from it without searching again. "2-shirt"
+also picks from the ranked list, not Evennia's database order. Successful
+searches are also cached for `BURST_SECONDS`, so commands (or queued
+@npc orders) resolving the same name over and over only search once.
+
 """
+import re
+import time
+from django.conf import settings
+from evennia.utils.utils import at_search_result as default_at_search_result
+from evennia.utils.utils import make_iter
+
+MULTIMATCH_REGEX = re.compile(settings.SEARCH_MULTIMATCH_REGEX, re.I + re.U)
+
+# How long a successful search is reused, in seconds.
+BURST_SECONDS = 1.0
+# How long a list of multiple matches can be picked from by number.
+CHOICES_SECONDS = 300
+# How many recent picks to remember for ranking.
+MAX_RECENT = 50
+
+
+def _memory(caller):
+    """
+    Where search state is kept: the caller's first session, or the
+    caller itself if nobody is puppeting it (like NPCs).
+    """
+    sessions = caller.sessions.get() if hasattr(caller, "sessions") else None
+    return sessions[0].ndb if sessions else caller.ndb
+
+
+def _names(obj):
+    aliases = obj.aliases.all() if hasattr(obj.aliases, "all") else obj.aliases
+    return [obj.key.lower()] + [alias.lower() for alias in aliases]
+
+
+def _reachable(caller, obj):
+    return bool(getattr(obj, "pk", None)) and \
+        getattr(obj, "location", None) in (caller, getattr(caller, "location", None))
+
+
+def remember_pick(caller, obj):
+    """
+    Note that `obj` was just picked, for ranking later searches.
+    """
+    objid = getattr(obj, "id", None)
+    if objid is None:
+        return
+    memory = _memory(caller)
+    recent = memory.search_recent
+    if recent is None:
+        recent = memory.search_recent = {}
+    recent[objid] = time.time()
+    if len(recent) > MAX_RECENT:
+        del recent[min(recent, key=recent.get)]
+
+
+def rank(matches, caller, query):
+    """
+    Sort matches from most to least likely meant.
+
+    Returns:
+        ranked (list): The matches, best first.
+
+    """
+    query = query.strip().lower()
+    worn = set()
+    if hasattr(caller, "get_worn"):
+        for garments in caller.get_worn().values():
+            worn.update(garments)
+    recent = _memory(caller).search_recent or {}
+
+    def sortkey(obj):
+        exact = query in _names(obj)
+        location = getattr(obj, "location", None)
+        place = 0 if obj in worn else 1 if location == caller else 2
+        return (not exact, place, -recent.get(getattr(obj, "id", None), 0))
+
+    return sorted(matches, key=sortkey)
+
+
+def within_constraints(caller, obj, kwargs):
+    """
+    Returns if `obj` could have been found by `caller.search` with these
+    keyword arguments: among the `candidates`, in the given `location`, of
+    the given `typeclass`, or (by default) carried or in the same room.
+    """
+    if not getattr(obj, "pk", None):
+        return False
+    if kwargs.get("candidates") is not None:
+        if obj not in kwargs["candidates"]:
+            return False
+    elif kwargs.get("location") is not None:
+        if getattr(obj, "location", None) not in make_iter(kwargs["location"]):
+            return False
+    elif not kwargs.get("global_search") and not _reachable(caller, obj):
+        return False
+    typeclass = kwargs.get("typeclass")
+    if typeclass and not any(obj.is_typeclass(tclass, exact=False) for tclass in make_iter(typeclass)):
+        return False
+    return True
+
+
+def remembered_choice(caller, query, kwargs):
+    """
+    If `query` is a bare number and the caller was recently shown a list
+    of multiple matches, returns that entry of the list, provided the
+    search now being made (`kwargs`, as given to `search`) could have
+    found it; else None.
+    """
+    query = query.strip()
+    if not query.isdigit():
+        return None
+    return _pick(caller, int(query), None, kwargs)
+
+
+def _pick(caller, number, name, kwargs):
+    """
+    Entry `number` of the remembered list, if it is recent, was made for
+    `name` (any name if None) and the entry passes `within_constraints`.
+    """
+    choices = _memory(caller).search_choices
+    if not choices or time.time() - choices[0] > CHOICES_SECONDS:
+        return None
+    if name is not None and choices[1] != name.strip().lower():
+        return None
+    index = number - 1
+    if not 0 <= index < len(choices[2]):
+        return None
+    obj = choices[2][index]
+    if not within_constraints(caller, obj, kwargs):
+        return None
+    remember_pick(caller, obj)
+    return obj
+
+
+def numbered_choice(caller, query, kwargs, search):
+    """
+    Resolve "<number>-<name>" against the ranked list `at_search_result`
+    shows, instead of the database order Evennia's search would use, so
+    "2-shirt" is the shirt that was listed as 2.
+
+    Args:
+        caller (Object): Who searches.
+        query (str): The search string.
+        kwargs (dict): The keyword arguments given to `search`.
+        search (callable): The unranked search, called as
+            `search(name, **kwargs)` when there is no list to pick from.
+
+    Returns:
+        obj (Object or None): The pick, or None if `query` isn't of that
+            form or the number is out of range.
+
+    """
+    match = MULTIMATCH_REGEX.match(query)
+    if not match:
+        return None
+    name, number = match.group("name"), int(match.group("number"))
+    picked = _pick(caller, number, name, kwargs)
+    if picked is not None:
+        return picked
+    matches = search(name, **dict(kwargs, quiet=True)) or []
+    ranked = rank(matches, caller, name)
+    if not 0 < number <= len(ranked):
+        return None
+    remember_pick(caller, ranked[number - 1])
+    return ranked[number - 1]
+
+
+def _burst_key(query, kwargs):
+    key = (query.strip().lower(), tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def cached_result(caller, query, kwargs):
+    """
+    The result of the same search made in the last `BURST_SECONDS`, if
+    what it found is still within reach; else None.
+    """
+    key = _burst_key(query, kwargs)
+    burst = _memory(caller).search_burst
+    if key is None or not burst or key not in burst:
+        return None
+    found_at, obj = burst[key]
+    if time.time() - found_at > BURST_SECONDS or not within_constraints(caller, obj, kwargs):
+        del burst[key]
+        return None
+    return obj
+
+
+def cache_result(caller, query, kwargs, obj):
+    """
+    Remember a successful search for `BURST_SECONDS`.
+    """
+    key = _burst_key(query, kwargs)
+    if key is None:
+        return
+    memory = _memory(caller)
+    now = time.time()
+    burst = memory.search_burst
+    if burst is None:
+        burst = memory.search_burst = {}
+    for stale in [stale for stale, (found_at, _) in burst.items() if now - found_at > BURST_SECONDS]:
+        del burst[stale]
+    burst[key] = (now, obj)
+
+
 
 
 def at_search_result(matches, caller, query="", quiet=False, **kwargs):
@@ -52,3 +270,14 @@ def at_search_result(matches, caller, query="", quiet=False, **kwargs):
             already have happened.
 
     """
+    if len(matches) > 1:
+        matches = rank(matches, caller, query)
+        exact = [obj for obj in matches[:2] if query.strip().lower() in _names(obj)]
+        if len(exact) == 1 and exact[0] is matches[0]:
+            matches = matches[:1]
+        else:
+            _memory(caller).search_choices = (time.time(), query.strip().lower(), matches)
+    result = default_at_search_result(matches, caller, query=query, quiet=quiet, **kwargs)
+    if result is not None:
+        remember_pick(caller, result)
+    return result
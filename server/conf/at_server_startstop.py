@@ -15,6 +15,8 @@ at_server_cold_start()
 at_server_cold_stop()
 
 """
+from evennia import create_script, search_script
+from world import warmup
 
 
 def at_server_start():
@@ -22,7 +24,15 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    if not search_script("game_stats"):
+        create_script("typeclasses.scripts.GameStatsScript")
+    if not search_script("npc_sweeper"):
+        create_script("typeclasses.scripts.NPCSweeperScript")
+    if not search_script("npc_behavior"):
+        create_script("typeclasses.scripts.BehaviorEngineScript")
+    if not search_script("expiry"):
+        create_script("typeclasses.scripts.ExpiryScript")
+    warmup.preload()
 
 
 def at_server_stop():
@@ -37,14 +47,14 @@ def at_server_reload_start():
     """
     This is called only when server starts back up after a reload.
     """
-    pass
+    warmup.restore_snapshot()
 
 
 def at_server_reload_stop():
     """
     This is called only time the server stops before a reload.
     """
-    pass
+    warmup.save_snapshot()
 
 
 def at_server_cold_start():
@@ -29,7 +29,121 @@ your settings file:
 
     COMMAND_PARSER = "server.conf.cmdparser.cmdparser"
 
+(which this game does). This parser matches exactly like Evennia's
+default one, but instead of comparing the input against every key and
+alias in the merged cmdset, it walks a prefix trie of them, so finding
+the candidates costs about as much as the length of the command name
+typed. The tries only hold the keys and aliases and the positions of
+the commands they belong to, so every merged cmdset with the same
+command names in the same order (every character has its own copies of
+its commands, and every room its own exits) shares one pair of tries;
+the last `CACHE_SIZE` of those are kept. A merged cmdset also keeps a
+reference to its tries, and Evennia's cmdhandler reuses a merged cmdset
+until the cmdsets merged into it change, so most parses don't even
+look them up.
+
+To compare it with the default parser in game:
+
+    @py from server.conf.cmdparser import benchmark; benchmark(me)
+
 """
+import re
+import time
+from collections import OrderedDict
+from django.conf import settings
+from evennia.commands.cmdparser import cmdparser as default_cmdparser
+from evennia.commands.cmdparser import create_match
+from evennia.utils import logger
+
+_CMD_IGNORE_PREFIXES = settings.CMD_IGNORE_PREFIXES
+_MULTIMATCH_REGEX = re.compile(settings.SEARCH_MULTIMATCH_REGEX, re.I + re.U)
+
+# How many distinct merged cmdsets to keep tries for.
+CACHE_SIZE = 64
+# {((key, aliases), ...): (trie, stripped trie)}
+_TRIES = OrderedDict()
+
+
+def _strip_prefix(name):
+    return name.lstrip(_CMD_IGNORE_PREFIXES) if len(name) > 1 else name
+
+
+def build_trie(commands, strip_prefixes=False):
+    """
+    Build a prefix trie of command keys and aliases.
+
+    Args:
+        commands (list): The commands of a cmdset, in order.
+        strip_prefixes (bool): Index names with `CMD_IGNORE_PREFIXES`
+            stripped off, like the default parser's second pass.
+
+    Returns:
+        trie (dict): Nested `{char: node}` dicts. A node's `None` key
+            holds `(order, cmdname, raw_cmdname, index)` for every name
+            ending there, where `order` is the position the default
+            parser would find it at and `index` that of its command in
+            `commands`.
+
+    """
+    trie = {}
+    order = 0
+    for index, cmd in enumerate(commands):
+        for raw_cmdname in [cmd.key] + cmd.aliases:
+            order += 1
+            cmdname = _strip_prefix(raw_cmdname) if strip_prefixes else raw_cmdname
+            if not cmdname:
+                continue
+            node = trie
+            for char in cmdname.lower():
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append((order, cmdname, raw_cmdname, index))
+    return trie
+
+
+def get_tries(cmdset):
+    """
+    The commands of a merged cmdset and its tries, as `(commands, trie,
+    stripped trie)`. Kept on the cmdset, and only built if no cmdset with
+    the same command names was seen lately.
+    """
+    cached = getattr(cmdset, "_trie_cache", None)
+    if cached is not None and len(cached[0]) == len(cmdset.commands):
+        return cached
+    commands = list(cmdset)
+    signature = tuple((cmd.key, tuple(cmd.aliases)) for cmd in commands)
+    tries = _TRIES.get(signature)
+    if tries is None:
+        tries = _TRIES[signature] = (build_trie(commands), build_trie(commands, strip_prefixes=True))
+        if len(_TRIES) > CACHE_SIZE:
+            _TRIES.popitem(last=False)
+    else:
+        _TRIES.move_to_end(signature)
+    cached = cmdset._trie_cache = (commands,) + tries
+    return cached
+
+
+def build_matches(raw_string, cmdset, include_prefixes=False):
+    """
+    Same as `evennia.commands.cmdparser.build_matches`, using the trie.
+    """
+    commands, trie, stripped_trie = get_tries(cmdset)
+    if not include_prefixes:
+        raw_string = _strip_prefix(raw_string)
+        trie = stripped_trie
+    l_raw_string = raw_string.lower()
+    found = []
+    node = trie
+    for char in l_raw_string:
+        node = node.get(char)
+        if node is None:
+            break
+        found.extend(node.get(None, ()))
+    matches = []
+    for _, cmdname, raw_cmdname, index in sorted(found, key=lambda entry: entry[0]):
+        cmd = commands[index]
+        if not cmd.arg_regex or cmd.arg_regex.match(l_raw_string[len(cmdname):]):
+            matches.append(create_match(cmdname, raw_string, cmd, raw_cmdname))
+    return matches
 
 
 def cmdparser(raw_string, cmdset, caller, match_index=None):
@@ -52,4 +166,120 @@ def cmdparser(raw_string, cmdset, caller, match_index=None):
             (possibly) separate multiple matches.
 
     """
-    # Your implementation here
+    if not raw_string:
+        return []
+
+    try:
+        # find matches, first using the full name
+        matches = build_matches(raw_string, cmdset, include_prefixes=True)
+        if not matches:
+            # try to match a number 1-cmdname, 2-cmdname etc
+            num_ref_match = _MULTIMATCH_REGEX.match(raw_string)
+            if num_ref_match:
+                new_raw_string = num_ref_match.group("name") + num_ref_match.group("args")
+                return cmdparser(new_raw_string, cmdset, caller,
+                                 match_index=int(num_ref_match.group("number")))
+            if _CMD_IGNORE_PREFIXES:
+                # still no match. Try to strip prefixes
+                raw_string = _strip_prefix(raw_string)
+                matches = build_matches(raw_string, cmdset, include_prefixes=False)
+    except Exception:
+        logger.log_trace("cmdparser error. raw_input:%s" % raw_string)
+        return []
+
+    # only select command matches we are actually allowed to call.
+    matches = [match for match in matches if match[2].access(caller, "cmd")]
+
+    # try to bring the number of matches down to 1
+    if len(matches) > 1:
+        # See if it helps to analyze the match with preserved case but only if
+        # it leaves at least one match.
+        trimmed = [match for match in matches if raw_string.startswith(match[0])]
+        if trimmed:
+            matches = trimmed
+
+    if len(matches) > 1:
+        # we still have multiple matches. Sort them by count quality.
+        matches = sorted(matches, key=lambda m: m[3])
+        # only pick the matches with highest count quality
+        quality = [mat[3] for mat in matches]
+        matches = matches[-quality.count(quality[-1]):]
+
+    if len(matches) > 1:
+        # still multiple matches. Fall back to ratio-based quality.
+        matches = sorted(matches, key=lambda m: m[4])
+        # only pick the highest rated ratio match
+        quality = [mat[4] for mat in matches]
+        matches = matches[-quality.count(quality[-1]):]
+
+    if len(matches) > 1 and match_index is not None and 0 < match_index <= len(matches):
+        # We couldn't separate match by quality, but we have an
+        # index argument to tell us which match to use.
+        matches = [matches[match_index - 1]]
+
+    # no matter what we have at this point, we have to return it.
+    return matches
+
+
+# inputs for `benchmark`: the overlapping @-commands, ordinary commands,
+# numbered and mistyped ones.
+BENCHMARK_INPUTS = (
+    "@worn shirt = is wearing a shirt", "@worntoggled shirt = rolled up", "@toggle1 shirt = x",
+    "@togglecov+ shirt = arms", "@toggle2 shirt = y", "@coverage+ shirt = torso", "@state/add shirt/open",
+    "@npc guards = say Halt!", "@char idle = leans here.", "look", "l me", "say hello", "pose waves",
+    "wear shirt", "remove shirt", "toggle shirt", "inventory", "i", "2-look", "@wor", "xyzzy",
+)
+
+
+def benchmark(caller, inputs=BENCHMARK_INPUTS, repeat=200):
+    """
+    Time this parser against Evennia's default on the caller's current
+    merged cmdset, and check that both give the same matches. Besides
+    parsing with the tries at hand, it times what a new merged cmdset
+    costs: finding the shared tries for it, or building them when no set
+    with the same commands was seen lately.
+
+    Args:
+        caller (Object): Whose cmdsets to use; results are sent to them.
+        inputs (iterable, optional): Raw inputs to parse.
+        repeat (int, optional): How many times to parse each input.
+
+    Returns:
+        timings (tuple): `(default_ms, trie_ms, mismatches, lookup_ms,
+            build_ms)`, the last two per new merged cmdset.
+
+    """
+    from evennia.commands.cmdhandler import get_and_merge_cmdsets
+
+    merged = []
+    get_and_merge_cmdsets(caller, None, None, caller, "object", "").addCallback(merged.append)
+    cmdset = merged[0]
+    mismatches = [raw for raw in inputs
+                  if [match[:3] for match in default_cmdparser(raw, cmdset, caller)]
+                  != [match[:3] for match in cmdparser(raw, cmdset, caller)]]
+    timings = []
+    for parser in (default_cmdparser, cmdparser):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for raw in inputs:
+                parser(raw, cmdset, caller)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    signature = tuple((cmd.key, tuple(cmd.aliases)) for cmd in cmdset)
+    for shared in (True, False):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cmdset._trie_cache = None
+            if not shared:
+                _TRIES.pop(signature, None)
+            get_tries(cmdset)
+        timings.append((time.perf_counter() - start) * 1000.0 / repeat)
+    calls = repeat * len(inputs)
+    caller.msg("%i commands in the merged set, %i parses each:\n"
+               "  default: %.1f ms (%.1f us/parse)\n"
+               "  trie:    %.1f ms (%.1f us/parse)\n"
+               "  new merged set: %.1f us to find its tries, %.1f ms to build them\n"
+               "  differing results: %s"
+               % (len(cmdset.commands), calls, timings[0], timings[0] * 1000.0 / calls,
+                  timings[1], timings[1] * 1000.0 / calls, timings[2] * 1000.0, timings[3],
+                  ", ".join(mismatches) or "none"))
+    return timings[0], timings[1], mismatches, timings[2], timings[3]
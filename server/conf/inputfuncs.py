@@ -25,6 +25,8 @@ as argument.
     default(session, cmdname, *args, **kwargs)
 
 """
+from world.appearance import character_payload, room_payload
+from world import presence
 
 # def oob_echo(session, *args, **kwargs):
 #     """
@@ -50,3 +52,71 @@ as argument.
 #
 #     """
 #     pass
+
+
+def appearance(session, *args, **kwargs):
+    """
+    Structured (JSON) appearance of a character or room, for clients that
+    render descriptions themselves instead of showing the ANSI text.
+
+    Client sends:
+        ["appearance", [<target>], {"known": {<part>: <version>, ...}}]
+
+    where target is a name or #dbref searched from the puppet (default:
+    the puppet's location). Parts whose version matches `known` are left
+    out of the reply, so a client that caches them only receives what
+    changed. The reply is:
+
+        ["appearance", [], <payload>]
+
+    see `world.appearance.build_payload` for the payload layout.
+
+    Args:
+        session (Session): The Session asking.
+        args (list): Optional target.
+        kwargs (dict): Optional `known` part versions.
+
+    """
+    puppet = session.puppet
+    if not puppet:
+        return
+    target = args[0] if args else None
+    if target:
+        matches = puppet.search(target, quiet=True)
+        if not matches or len(matches) > 1:
+            session.msg(appearance=((), {"error": "Could not find '%s'." % target}))
+            return
+        obj = matches[0]
+    else:
+        obj = puppet.location
+    if not obj or not obj.access(puppet, "view"):
+        return
+    known = kwargs.get("known") or {}
+    if obj.is_typeclass("typeclasses.characters.Character", exact=False):
+        payload = character_payload(obj, puppet, known)
+    elif obj.is_typeclass("typeclasses.rooms.Room", exact=False):
+        payload = room_payload(obj, puppet, known)
+    else:
+        session.msg(appearance=((), {"error": "No structured appearance for '%s'." % obj.key}))
+        return
+    session.msg(appearance=((), payload))
+
+
+def presence_sync(session, *args, **kwargs):
+    """
+    Snapshot of who is in the puppet's room, to (re)build a client's
+    occupant panel. See world/presence.py for the events that follow.
+
+    Client sends:
+        ["presence_sync", [], {}]
+    Reply:
+        ["presence_sync", [], {"room", "epoch", "seq", "occupants"}]
+
+    Args:
+        session (Session): The Session asking.
+
+    """
+    puppet = session.puppet
+    if not puppet or not puppet.location:
+        return
+    session.msg(presence_sync=((), presence.snapshot(puppet.location)))
@@ -3,7 +3,8 @@
 MSSP (Mud Server Status Protocol) meta information
 
 Modify this file to specify what MUD listing sites will report about your game.
-All fields are static. The number of currently active players and your game's
+Most fields are static. The world totals (ROOMS, EXITS, MOBILES, OBJECTS,
+DBSIZE) come from world/gamestats.py, recounted in the background. The number of currently active players and your game's
 current uptime will be added automatically by Evennia.
 
 You don't have to fill in everything (and most fields are not shown/used by all
@@ -18,6 +19,8 @@ needed on the Evennia side.
 
 """
 
+from world.gamestats import stat
+
 MSSPTable = {
     # Required fields
     "NAME": "Evennia",
@@ -49,9 +52,9 @@ MSSPTable = {
     # World
     "AREAS": "0",
     "HELPFILES": "0",
-    "MOBILES": "0",
-    "OBJECTS": "0",
-    "ROOMS": "0",  # use 0 if room-less
+    "MOBILES": stat("npcs"),
+    "OBJECTS": stat("objects"),
+    "ROOMS": stat("rooms"),  # use 0 if room-less
     "CLASSES": "0",  # use 0 if class-less
     "LEVELS": "0",  # use 0 if level-less
     "RACES": "0",  # use 0 if race-less
@@ -80,8 +83,8 @@ MSSPTable = {
     "HIRING CODERS": "0",
     # Extended variables
     # World
-    "DBSIZE": "0",
-    "EXITS": "0",
+    "DBSIZE": stat("dbsize"),
+    "EXITS": stat("exits"),
     "EXTRA DESCRIPTIONS": "0",
     "MUDPROGS": "0",
     "MUDTRIGS": "0",
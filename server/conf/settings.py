@@ -34,6 +34,45 @@ from evennia.settings_default import *
 # This is the name of your game. Make it catchy!
 SERVERNAME = "dust"
 
+# Match commands with a prefix trie instead of scanning every key and
+# alias (see server/conf/cmdparser.py).
+COMMAND_PARSER = "server.conf.cmdparser.cmdparser"
+
+# Rank multiple search matches and remember them, so a bare number picks
+# one (see server/conf/at_search.py).
+SEARCH_AT_RESULT = "server.conf.at_search.at_search_result"
+
+# Time every command and count its database queries from server start
+# (see world/metrics.py). Can also be switched at runtime with @perf/on.
+COMMAND_PERF_ENABLED = False
+
+# Token a Prometheus scraper sends ("Authorization: Bearer <token>") to
+# read /metrics/ without logging in as staff. None turns that off; set it
+# in secret_settings.py.
+METRICS_TOKEN = None
+
+# NPCs nobody used with @npc or @char for this many days are swept up
+# by the NPC sweeper (see world/npcs.py): "archive" takes them off the
+# grid, "delete" deletes them. The sweeper handles this many per
+# transaction.
+NPC_ABANDON_DAYS = 30
+NPC_SWEEP_ACTION = "archive"
+NPC_SWEEP_CHUNK = 100
+
+# The NPC idle behavior engine (see world/behavior.py) ticks every
+# NPC_IDLE_TICK seconds, and spends at most NPC_IDLE_BUDGET_MS
+# milliseconds per tick before leaving work for the next one.
+NPC_IDLE_TICK = 5
+NPC_IDLE_BUDGET_MS = 20
+
+# Temp-idle poses clear themselves after this many seconds without a
+# command (see world/expiry.py), as well as when the character moves.
+TEMP_IDLEPOSE_TIMEOUT = 30 * 60
+
+# At server start, the characters of accounts that logged in during the
+# last CACHE_WARM_DAYS days are loaded ahead of time (see world/warmup.py).
+CACHE_WARM_DAYS = 7
+
 
 ######################################################################
 # Settings given in secret_settings.py override those in this file.
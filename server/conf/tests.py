@@ -0,0 +1,85 @@
+"""
+Tests for the server hooks.
+
+Run with `evennia test --settings settings.py .` from the game dir.
+
+"""
+from evennia import CmdSet, Command
+from evennia.commands.cmdparser import build_matches as default_build_matches
+from evennia.commands.cmdparser import cmdparser as default_cmdparser
+from evennia.utils.test_resources import EvenniaTest
+
+from server.conf import cmdparser
+
+
+def _command(key, aliases=(), arg_regex=None, locks="cmd:all()"):
+    return Command(key=key, aliases=list(aliases), arg_regex=arg_regex, locks=locks)
+
+
+class ParserCmdSet(CmdSet):
+    key = "parser_test"
+
+    def at_cmdset_creation(self):
+        self.add(_command("look", aliases=["l", "ls"], arg_regex=r"\s.*?|$"))
+        self.add(_command("get", aliases=["grab"]))
+        self.add(_command("get all", aliases=["get everything"]))
+        self.add(_command("@worn"))
+        self.add(_command("@worntoggled"))
+        self.add(_command("worn"))
+        self.add(_command("@toggle1"))
+        self.add(_command("@toggle2"))
+        self.add(_command("toggle"))
+        self.add(_command("@char", aliases=["@character"]))
+        self.add(_command("+who", aliases=["who"]))
+        self.add(_command("@locked", locks="cmd:false()"))
+
+
+class TestTrieCmdParser(EvenniaTest):
+    """
+    The trie parser has to give exactly the default parser's matches.
+    """
+
+    inputs = (
+        # prefixes of longer keys, and keys that are prefixes of others
+        "@worn shirt = is wearing a shirt", "@worntoggled shirt = x", "@wor", "@worn", "worn shirt",
+        "@toggle1 shirt", "@toggle", "toggle shirt",
+        # aliases, and case
+        "l", "l me", "ls", "LOOK here", "Look", "lx", "grab rock", "@Character idle = x",
+        # multi-word keys and aliases
+        "get", "get rock", "get all", "get all rocks", "get everything", "get every",
+        # ignored prefixes, numbered matches and no match
+        "who", "+who", "@who", "+char", "1-get all", "2-get all", "@locked", "xyzzy", "", "@",
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.cmdset = ParserCmdSet()
+        cmdparser._TRIES.clear()
+
+    def test_build_matches(self):
+        for raw in self.inputs:
+            for include_prefixes in (True, False):
+                with self.subTest(raw=raw, include_prefixes=include_prefixes):
+                    self.assertEqual(
+                        cmdparser.build_matches(raw, self.cmdset, include_prefixes=include_prefixes),
+                        default_build_matches(raw, self.cmdset, include_prefixes=include_prefixes))
+
+    def test_cmdparser(self):
+        for raw in self.inputs:
+            with self.subTest(raw=raw):
+                self.assertEqual(cmdparser.cmdparser(raw, self.cmdset, self.char1),
+                                 default_cmdparser(raw, self.cmdset, self.char1))
+
+    def test_trie_rebuilt_when_commands_change(self):
+        cmdparser.cmdparser("look", self.cmdset, self.char1)
+        self.cmdset.add(_command("lookup"))
+        self.assertEqual(cmdparser.cmdparser("lookup x", self.cmdset, self.char1),
+                         default_cmdparser("lookup x", self.cmdset, self.char1))
+
+    def test_tries_shared_between_copies(self):
+        # another character's copies of the same commands
+        other = ParserCmdSet()
+        self.assertIs(cmdparser.get_tries(other)[1], cmdparser.get_tries(self.cmdset)[1])
+        self.assertEqual(cmdparser.cmdparser("get all", other, self.char1),
+                         default_cmdparser("get all", other, self.char1))
+        self.assertIn(cmdparser.cmdparser("get all", other, self.char1)[0][2], other.commands)
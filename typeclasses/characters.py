@@ -7,12 +7,22 @@ is setup to be the "default" character type created by the default
 creation commands.
 
 """
+import time
+from django.conf import settings
+from django.db import transaction
 from evennia import DefaultCharacter
-from config.configlists import NAKEDS_LIST
+from config.configlists import DEFAULT_BODY_PLAN
+from server.conf import at_search
+from typeclasses.mixins import TrackedAttributesMixin
+from world.appearance import render_body
+from world.bodyplans import get_body_plan
+from world.broadcast import broadcast
+from world import expiry
+from world import presence
 
 
 
-class Character(DefaultCharacter):
+class Character(TrackedAttributesMixin, DefaultCharacter):
     """
     The Character defaults to reimplementing some of base Object's hook methods with the
     following functionality:
@@ -21,7 +31,9 @@ class Character(DefaultCharacter):
                     (important!)sets locks so character cannot be picked up
                     and its commands only be called by itself, not anyone else.
                     (to change things, use at_object_creation() instead).
-    at_after_move(source_location) - Launches the "look" command after every move.
+    at_after_move(source_location) - Launches the "look" command after every move, or
+                    a brief room header if the character has brief mode on. Characters
+                    without sessions (like NPCs ordered around with @npc) get nothing.
     at_post_unpuppet(account) -  when Account disconnects from the Character, we
                     store the current location in the pre_logout_location Attribute and
                     move it to a None-location so the "unpuppeted" character
@@ -32,21 +44,184 @@ class Character(DefaultCharacter):
     at_post_puppet - Echoes "AccountName has entered the game" to the room.
 
     """
-    def at_object_creation(self):
-        if not self.attributes.has("idlepose"):
-            self.attributes.add("idlepose", "is standing here.")
-        if not self.attributes.has("temp_idlepose"):
-            self.attributes.add("temp_idlepose", "is standing here.")
-        if not self.attributes.has("sleep_idlepose"):
-            self.attributes.add("sleep_idlepose", "is sleeping here.")
+    # Defaults are served from here and never stored; see TrackedAttributesMixin.
+    # Regions missing from `worn` have nothing on them.
+    attribute_defaults = {
+        "idlepose": "is standing here.",
+        "temp_idlepose": "",
+        "sleep_idlepose": "is sleeping here.",
+        "worn": {},
+        "skintone": "|n",
+        "body_plan": DEFAULT_BODY_PLAN,
+        # {group name: [npc, ...]}, see @npc/group
+        "npc_groups": {},
+    }
+    # Each naked is its own Attribute in this category, keyed by region, so one
+    # region can be read or written without unpickling all the others. Regions
+    # without an Attribute have an empty description.
+    nakeds_category = "nakeds"
+    # Attributes that change the rendered body, see bump_wardrobe_version.
+    appearance_attributes = ("worn", "skintone", "body_plan")
+
+    def get_pose(self):
+        """
+        Returns the pose shown after the character's name in room descriptions.
+        """
+        return self.get_attribute("temp_idlepose") or self.get_attribute("idlepose")
+
+    def has_wardrobe(self):
+        """
+        Returns if the character has wardrobe and nakeds state of its own.
+        Always True here; slim NPCs (typeclasses/npcs.py) only get one
+        when first edited.
+        """
+        return True
+
+    def get_wardrobe_version(self):
+        """
+        Returns a number that goes up every time the character's nakeds,
+        worn clothing (or the clothing's messages and state), skintone or
+        body plan change. Cached renders are tagged with it. It is also
+        the time of the last change, in milliseconds since the epoch
+        (0 if nothing ever changed), so it never repeats an old value.
+        """
+        return self.attributes.get("wardrobe_version", default=0)
+
+    def bump_wardrobe_version(self):
+        """
+        Marks everything rendered from the wardrobe as out of date.
+        """
+        now = int(time.time() * 1000)
+        self.attributes.add("wardrobe_version", max(self.get_wardrobe_version() + 1, now))
+
+    def at_attribute_changed(self, key, category=None):
+        if category is None and key in self.appearance_attributes:
+            self.bump_wardrobe_version()
+        elif category is None and key == "temp_idlepose":
+            if self.get_attribute("temp_idlepose"):
+                expiry.expire_later(self, "clear_temp_idlepose", settings.TEMP_IDLEPOSE_TIMEOUT)
+            else:
+                expiry.cancel(self, "clear_temp_idlepose")
+
+    def get_body_plan(self):
+        """
+        Returns the compiled BodyPlan (see world/bodyplans.py) for this character.
+        """
+        return get_body_plan(self.get_attribute("body_plan"))
+
+    def _migrate_nakeds(self):
+        """
+        Splits nakeds stored the old way, as one dict Attribute, into one
+        Attribute per region.
+        """
         if not self.attributes.has("nakeds"):
-            naked_dict = {naked: "" for naked in NAKEDS_LIST}
-            self.attributes.add("nakeds", naked_dict)
-        if not self.attributes.has("worn"):
-            worn_dict = {naked: [] for naked in NAKEDS_LIST}
-            self.attributes.add("worn", worn_dict)
-        if not self.attributes.has('skintone'):
-            self.attributes.add('skintone', '|n')
+            return
+        legacy = [(region, value, self.nakeds_category)
+                  for region, value in self.attributes.get("nakeds").items() if value]
+        with transaction.atomic():
+            self.attributes.remove("nakeds")
+            if legacy:
+                self.attributes.batch_add(*legacy)
+
+    def get_naked(self, region):
+        """
+        Returns the naked description for one region, or an empty string.
+        """
+        self._migrate_nakeds()
+        return self.attributes.get(region, default="", category=self.nakeds_category)
+
+    def get_nakeds(self):
+        """
+        Returns {region: description} for every region of the body plan, in order.
+        """
+        return {naked: self.get_naked(naked) for naked in self.get_body_plan().regions}
+
+    def set_naked(self, region, description):
+        """
+        Sets (or with an empty description, clears) the naked for one region.
+        """
+        return self.set_nakeds({region: description})
+
+    def set_nakeds(self, nakeds):
+        """
+        Sets or clears several nakeds in one transaction. Regions whose
+        description doesn't change are not written.
+
+        Args:
+            nakeds (dict): {region: description}, an empty description clears.
+
+        Returns:
+            changed (int): How many regions were written or cleared.
+
+        """
+        self._migrate_nakeds()
+        category = self.nakeds_category
+        to_set = [(region, description, category) for region, description in nakeds.items()
+                  if description and self.get_naked(region) != description]
+        to_clear = [region for region, description in nakeds.items()
+                    if not description and self.attributes.has(region, category=category)]
+        if to_set or to_clear:
+            with transaction.atomic():
+                if to_set:
+                    self.attributes.batch_add(*to_set)
+                for region in to_clear:
+                    self.attributes.remove(region, category=category)
+                self.bump_wardrobe_version()
+        return len(to_set) + len(to_clear)
+
+    def get_worn(self):
+        """
+        Returns {region: [clothing, ...]} for every region with something on it,
+        with the outermost layer last.
+        """
+        return {region: list(items) for region, items in self.get_attribute("worn").items() if items}
+
+    def add_worn(self, clothing, regions):
+        """
+        Layers a piece of clothing on top of the given regions.
+        """
+        self.update_worn(clothing, add=regions)
+
+    def remove_worn(self, clothing, regions=None):
+        """
+        Takes a piece of clothing off the given regions, or off every region
+        it is on if no regions are given.
+        """
+        self.update_worn(clothing, remove=regions if regions is not None else list(self.get_worn()))
+
+    def update_worn(self, clothing, add=(), remove=()):
+        """
+        Takes a piece of clothing off some regions and layers it on top of
+        others, with a single write.
+        """
+        worn = self.get_worn()
+        for region in remove:
+            if clothing in worn.get(region, ()):
+                worn[region].remove(clothing)
+        for region in add:
+            worn.setdefault(region, []).append(clothing)
+        self.set_attribute("worn", {region: items for region, items in worn.items() if items})
+
+    def search(self, searchdata, **kwargs):
+        """
+        The default search, except that a bare number or "<number>-<name>"
+        picks from the ranked list of multiple matches, and a search
+        repeated within a moment reuses the earlier result (see
+        server/conf/at_search.py).
+        """
+        if not isinstance(searchdata, str):
+            return super().search(searchdata, **kwargs)
+        picked = at_search.remembered_choice(self, searchdata, kwargs)
+        if picked is None:
+            picked = at_search.numbered_choice(self, searchdata, kwargs, super().search)
+        if picked is None:
+            picked = at_search.cached_result(self, searchdata, kwargs)
+        if picked is not None:
+            return [picked] if kwargs.get("quiet") else picked
+        result = super().search(searchdata, **kwargs)
+        if result is not None and not kwargs.get("quiet"):
+            at_search.cache_result(self, searchdata, kwargs, result)
+        return result
 
     def return_appearance(self, looker):
         """
@@ -55,11 +230,9 @@ class Character(DefaultCharacter):
         Args:
             looker (Object): Object doing the looking.
         Notes:
-            The name of every clothing item carried and worn by the character
-            is appended to their description. If the clothing's db.worn value
-            is set to True, only the name is appended, but if the value is a
-            string, the string is appended to the end of the name, to allow
-            characters to specify how clothing is worn.
+            The nakeds and worn clothing are appended to the description,
+            layer by layer (see world/appearance.py). That part is cached
+            until the character's wardrobe version changes.
         """
         if not looker:
             return ""
@@ -69,65 +242,35 @@ class Character(DefaultCharacter):
         if desc:
             string += "%s" % desc
 
-        worn = self.db.worn
-
-        worn_set = set()
-        shown_set = set()
-
-        # TODO DUST-58
-        skintone = self.db.skintone if self.attributes.has("skintone") else "|W" #TODO DELETE THIS NEPHEW...
-
-        for naked, clothing in worn.items():
-            if len(clothing) != 0:
-                worn_set.add(naked)
-        naked_dict = self.db.nakeds
-        for naked_name, naked_value in naked_dict.items():
-            # Possible I'm breaking this with the expanded check for empty string
-            string += '\n\n' if ((naked_name == 'head'
-                                 or naked_name == 'left-shoulder'
-                                 or naked_name == 'groin') and naked_value != '') else ''
-            if naked_name in worn_set:
-                # What in god's name was I doing with this
-                # update: it appears the second index is to get the packed db object itself but there
-                # absolutely has got to be a better way
-                if worn[naked_name][-1].attributes.get("toggled"):
-                    clothing_item_string = worn[naked_name][-1].attributes.get("messages")['worntoggled']
-                else:
-                    clothing_item_string = worn[naked_name][-1].attributes.get("messages")['worn']
-                # I do not understand why we need this
-                # in fact I'm almost certain we can axe this
-                # like we never do anything but add these to it
-                # I feel like it had/has to do with layering?
-                if not worn[naked_name][-1] in shown_set:
-                    string += ('%s ' % clothing_item_string)
-                    shown_set.add(worn[naked_name][-1])
-                if worn[naked_name][-1].attributes.get("seethru"):
-                    string += ('%s%s|n ' % (skintone, naked_value))
-            else:
-                string += ('%s%s|n ' % (skintone, naked_value))
+        string += render_body(self)
         return string
 
     def at_post_puppet(self, **kwargs):
         self.msg("\nYou become |c%s|n.\n" % self.name)
         self.msg(self.at_look(self.location))
-
-        def message(obj, from_obj):
-            obj.msg("%s blinks their eyes." % self.get_display_name(obj), from_obj=from_obj)
-        self.location.for_contents(message, exclude=[self], from_obj=self)
+        broadcast(self.location, self, "blinks their eyes.", exclude=self)
+        presence.emit(self.location, "awake", self)
 
     def at_post_unpuppet(self, account, session=None, **kwargs):
 
         if not self.sessions.count():
             if self.location:
-                def message(obj, from_obj):
-                    obj.msg("%s falls to the ground, unconscious." % self.get_display_name(obj), from_obj=from_obj)
-                self.location.for_contents(message, exclude=[self], from_obj=self)
+                broadcast(self.location, self, "falls to the ground, unconscious.", exclude=self)
+                presence.emit(self.location, "asleep", self)
                 self.db.prelogout_location = self.location
 
     def at_after_move(self, source_location):
 
-        if self.attributes.has('temp_idlepose'):
-            self.db.temp_idlepose = ""
+        self.set_attribute('temp_idlepose', "")
+        presence.emit(source_location, "leave", self)
+        presence.emit(self.location, "enter", self)
+
+        if not self.sessions.count():
+            # nobody is looking through this character, don't render anything
+            return
 
         if self.location.access(self, "view"):
-            self.msg(self.at_look(self.location))
+            if self.db.brief and hasattr(self.location, "return_brief"):
+                self.msg(self.location.return_brief(self))
+            else:
+                self.msg(self.at_look(self.location))
@@ -1,23 +1,273 @@
 
+from django.db import transaction
 from evennia import DefaultObject
-from config.configlists import CLOTHING_MESSAGE_TYPES, NAKEDS_LIST
+from typeclasses.mixins import TrackedAttributesMixin
+from world.bodyplans import get_body_plan
+from world.broadcast import broadcast
 
+# The classic toggle messages and which state/state message they map to.
+LEGACY_STATE_MESSAGES = {
+    "worn": ("default", "worn"),
+    "toggle2": ("default", "to"),
+    "otoggle2": ("default", "oto"),
+    "worntoggled": ("toggled", "worn"),
+    "toggle1": ("toggled", "to"),
+    "otoggle1": ("toggled", "oto"),
+}
 
-class Clothing(DefaultObject):
 
-    def at_object_creation(self):
-        if not self.db.messages:
-            self.db.messages = {message: "" for message in CLOTHING_MESSAGE_TYPES}
-        if not self.db.coverage:
-            self.db.coverage = []
-        if not self.db.togglecoverage:
-            self.db.togglecoverage = []
-        if not self.db.toggled:
-            self.db.toggled = False
-        if not self.db.seethru:
-            self.db.seethru = False
-        if not self.db.color:
-            self.db.color = ""
+class Clothing(TrackedAttributesMixin, DefaultObject):
+    """
+    A wearable item. Clothing has any number of named states (zipped,
+    unzipped, hood up...), each with its own coverage and 'to', 'oto' and
+    'worn' messages (see STATE_MESSAGE_TYPES). Clothing that was never
+    given states has the two classic ones, 'default' and 'toggled', built
+    from its coverage/togglecoverage and toggle/worn messages.
+
+    Whenever states are tailored, the regions to add and remove when going
+    from any state to any other are worked out and stored in the
+    'transitions' Attribute, so switching state just applies that delta.
+    """
+
+    # Defaults are served from here and never stored; see TrackedAttributesMixin.
+    # Message types missing from `messages` are empty.
+    attribute_defaults = {
+        "messages": {},
+        "coverage": [],
+        "togglecoverage": [],
+        "toggled": False,
+        "seethru": False,
+        "color": "",
+        "worn": False,
+        "body_plan": None,
+    }
+    # Attributes that are part of the wearer's rendered appearance.
+    appearance_attributes = ("messages", "toggled", "seethru", "state", "states")
+
+    def get_message(self, message_type):
+        """
+        Returns one of the CLOTHING_MESSAGE_TYPES messages, or an empty string.
+        """
+        if message_type in LEGACY_STATE_MESSAGES:
+            state, state_message_type = LEGACY_STATE_MESSAGES[message_type]
+            return self.get_states().get(state, {}).get("messages", {}).get(state_message_type, "")
+        return self.get_attribute("messages").get(message_type, "")
+
+    def set_message(self, message_type, message):
+        """
+        Sets (or with an empty message, clears) one of the CLOTHING_MESSAGE_TYPES messages.
+        """
+        if message_type in LEGACY_STATE_MESSAGES:
+            self.set_state_message(*(LEGACY_STATE_MESSAGES[message_type] + (message,)))
+            return
+        messages = {key: value for key, value in self.get_attribute("messages").items() if value}
+        if message:
+            messages[message_type] = message
+        else:
+            messages.pop(message_type, None)
+        self.set_attribute("messages", messages)
+
+    def get_worn_message(self):
+        """
+        Returns the message shown in the wearer's description for the current state.
+        """
+        return self.get_states()[self.get_state()]["messages"].get("worn", "")
+
+    def at_attribute_changed(self, key, category=None):
+        # our messages and state are part of the wearer's rendered appearance
+        wearer = self.location
+        if key in self.appearance_attributes and self.db.worn \
+                and hasattr(wearer, "bump_wardrobe_version"):
+            wearer.bump_wardrobe_version()
+
+    def get_states(self):
+        """
+        Returns {state: {"coverage": [region, ...], "messages": {type: message}}},
+        in the order states are cycled through.
+        """
+        states = self.attributes.get("states")
+        if states is not None:
+            return states
+        # never tailored with states; build the classic two from the old Attributes
+        messages = self.get_attribute("messages")
+        return {
+            "default": {"coverage": list(self.get_attribute("coverage")),
+                        "messages": {"to": messages.get("toggle2", ""), "oto": messages.get("otoggle2", ""),
+                                     "worn": messages.get("worn", "")}},
+            "toggled": {"coverage": list(self.get_attribute("togglecoverage")),
+                        "messages": {"to": messages.get("toggle1", ""), "oto": messages.get("otoggle1", ""),
+                                     "worn": messages.get("worntoggled", "")}},
+        }
+
+    def _save_states(self, states):
+        """
+        Stores tailored states along with the precomputed transitions between them.
+        """
+        transitions = {}
+        for source, source_state in states.items():
+            was = set(source_state["coverage"])
+            transitions[source] = {}
+            for target, target_state in states.items():
+                if target != source:
+                    now = target_state["coverage"]
+                    transitions[source][target] = ([region for region in now if region not in was],
+                                                   [region for region in source_state["coverage"]
+                                                    if region not in now])
+        with transaction.atomic():
+            self.set_attribute("states", states)
+            self.set_attribute("transitions", transitions)
+
+    def _get_states_for_update(self):
+        return {name: {"coverage": list(state["coverage"]), "messages": dict(state["messages"])}
+                for name, state in self.get_states().items()}
+
+    def add_state(self, state):
+        """
+        Adds a new state with no coverage and no messages.
+        """
+        states = self._get_states_for_update()
+        states.setdefault(state, {"coverage": [], "messages": {}})
+        self._save_states(states)
+
+    def remove_state(self, state):
+        """
+        Removes a state. The last state can't be removed.
+        Returns:
+            removed (bool): If the state was removed.
+        """
+        states = self._get_states_for_update()
+        if state not in states or len(states) == 1:
+            return False
+        del states[state]
+        coverage = self.get_coverage()
+        with transaction.atomic():
+            if self.get_state() == state:
+                self.set_state(next(iter(states)))
+            self._save_states(states)
+            self._rewear(coverage)
+        return True
+
+    def set_state_message(self, state, message_type, message):
+        """
+        Sets (or with an empty message, clears) a 'to', 'oto' or 'worn' message for a state.
+        """
+        states = self._get_states_for_update()
+        messages = states.setdefault(state, {"coverage": [], "messages": {}})["messages"]
+        if message:
+            messages[message_type] = message
+        else:
+            messages.pop(message_type, None)
+        self._save_states(states)
+
+    def get_state(self):
+        """
+        Returns the name of the state the clothing is in.
+        """
+        state = self.attributes.get("state")
+        if state is None:
+            state = "toggled" if self.get_attribute("toggled") else "default"
+        states = self.get_states()
+        return state if state in states else next(iter(states))
+
+    def set_state(self, state):
+        """
+        Sets the state without touching the wearer; see `switch_state`.
+        """
+        self.set_attribute("state", state)
+
+    def get_next_state(self):
+        """
+        Returns the state after the current one, going back to the first after the last.
+        """
+        names = list(self.get_states())
+        return names[(names.index(self.get_state()) + 1) % len(names)]
+
+    def get_transition(self, source, target):
+        """
+        Returns the (regions to add, regions to remove) going from state source to target.
+        """
+        transitions = self.attributes.get("transitions")
+        if transitions is None or source not in transitions:
+            # classic two-state clothing, which has no stored transitions
+            states = self.get_states()
+            was, now = states[source]["coverage"], states[target]["coverage"]
+            return [region for region in now if region not in was], [region for region in was if region not in now]
+        add, remove = transitions[source].get(target, ((), ()))
+        return list(add), list(remove)
+
+    def switch_state(self, wearer, state):
+        """
+        Moves the clothing to another state, applying the stored coverage delta
+        to the wearer if it is being worn.
+        """
+        add, remove = self.get_transition(self.get_state(), state)
+        self.set_state(state)
+        if self.db.worn:
+            wearer.update_worn(self, add=add, remove=remove)
+
+    def _rewear(self, coverage):
+        """
+        If the clothing is worn, moves it on the wearer from the regions in
+        `coverage` to the ones its current state covers now. Call after
+        changing the coverage of the current state outside switch_state.
+        """
+        wearer = self.location
+        if not self.db.worn or not hasattr(wearer, "update_worn"):
+            return
+        now = self.get_coverage()
+        add = [region for region in now if region not in coverage]
+        remove = [region for region in coverage if region not in now]
+        if add or remove:
+            wearer.update_worn(self, add=add, remove=remove)
+
+    def get_coverage(self):
+        """
+        Returns the regions this clothing covers in its current state.
+        """
+        return list(self.get_states()[self.get_state()]["coverage"])
+
+    def add_coverage(self, regions, toggled=False, state=None):
+        """
+        Adds regions to the coverage of a state (by default 'default', or with toggled, 'toggled').
+        """
+        state = state or ("toggled" if toggled else "default")
+        states = self._get_states_for_update()
+        coverage = states.setdefault(state, {"coverage": [], "messages": {}})["coverage"]
+        coverage.extend(region for region in regions if region not in coverage)
+        worn_coverage = self.get_coverage()
+        with transaction.atomic():
+            self._save_states(states)
+            self._rewear(worn_coverage)
+
+    def remove_coverage(self, regions, toggled=False, state=None):
+        """
+        Removes regions from the coverage of a state (by default 'default', or with toggled, 'toggled').
+        """
+        state = state or ("toggled" if toggled else "default")
+        states = self._get_states_for_update()
+        if state in states:
+            states[state]["coverage"] = [region for region in states[state]["coverage"] if region not in regions]
+            worn_coverage = self.get_coverage()
+            with transaction.atomic():
+                self._save_states(states)
+                self._rewear(worn_coverage)
+
+    def get_body_plan(self):
+        """
+        Returns the BodyPlan (see world/bodyplans.py) this clothing is cut
+        for, which its coverage is tailored against. Set with @fit.
+        """
+        return get_body_plan(self.get_attribute("body_plan"))
+
+    def get_misfits(self, plan):
+        """
+        Returns the regions covered in any state that the BodyPlan plan doesn't have.
+        """
+        misfits = []
+        for state in self.get_states().values():
+            misfits.extend(region for region in state["coverage"]
+                           if region not in plan.index and region not in misfits)
+        return misfits
 
     def wear(self, wearer):
         """
@@ -26,28 +276,27 @@ class Clothing(DefaultObject):
             wearer (obj): character object wearing this clothing object
         """
         # Set clothing as worn
-        self.db.worn = True
-
-        covered_list = [naked for naked in self.db.coverage]
-        for covered in covered_list:
-            wearer.db.worn[covered].append(self)
+        self.set_attribute("worn", True)
+        wearer.add_worn(self, self.get_coverage())
 
         # Echo a message to the room
-        message = "%s %s " % (wearer, self.db.messages['owear'])
-        wearer.msg("%s %s " % ("You", self.db.messages['wear']))
-        wearer.location.msg_contents(message, exclude=wearer)
+        wearer.msg("%s %s " % ("You", self.get_message('wear')))
+        broadcast(wearer.location, wearer, self.get_message('owear'), exclude=wearer)
 
-    def remove(self, wearer):
+    def remove(self, wearer, quiet=False):
         """
         Removes worn clothes and optionally echoes to the room.
         Args:
             wearer (obj): character object wearing this clothing object
+            quiet (bool): if True, don't echo anything
         """
-        self.db.worn = False
+        self.set_attribute("worn", False)
+        wearer.remove_worn(self)
 
-        remove_message = "%s %s " % (wearer, self.db.messages['oremove'])
-        wearer.msg("%s %s " % ("You", self.db.messages['remove']))
-        wearer.location.msg_contents(remove_message, exclude=wearer)
+        if quiet:
+            return
+        wearer.msg("%s %s " % ("You", self.get_message('remove')))
+        broadcast(wearer.location, wearer, self.get_message('oremove'), exclude=wearer)
 
     def at_get(self, getter):
         """
@@ -55,4 +304,4 @@ class Clothing(DefaultObject):
         when they're picked up, in case they've somehow had their
         location changed without getting removed.
         """
-        self.db.worn = False
+        self.set_attribute("worn", False)
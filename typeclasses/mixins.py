@@ -0,0 +1,96 @@
+"""
+Mixins
+
+Behaviour shared between several of the game's typeclasses. Mix these
+in before the Evennia parent, e.g.
+
+    class Character(TrackedAttributesMixin, DefaultCharacter):
+        ...
+
+"""
+import copy
+from world import metrics
+
+
+class TrackedAttributesMixin:
+    """
+    Attribute helpers that skip database writes which would not change
+    anything. Reads go through the Attribute cache, so checking whether a
+    write is needed costs no query once the object's Attributes are loaded.
+
+    Defaults are declared on the class in `attribute_defaults` and served
+    by `get_attribute` without ever being stored; only values that differ
+    from the default get a database row.
+
+    get_attribute(key) - stored value, or the class default.
+    set_attribute(key, value) - store value only if it differs from what's stored.
+    at_attribute_changed(key, category) - hook called after set_attribute changed something.
+
+    """
+
+    # {key: default} for uncategorized Attributes. Mutable defaults are
+    # copied on read; changes to them are only kept once passed back
+    # through set_attribute.
+    attribute_defaults = {}
+
+    def get_attribute(self, key, category=None):
+        """
+        Get an Attribute, falling back to the class-level default.
+
+        Args:
+            key (str): Attribute key.
+            category (str, optional): Attribute category. Class defaults
+                only apply to uncategorized Attributes.
+
+        Returns:
+            value (any): The stored value, or a copy of the default (or
+                `None` if there is no default).
+
+        """
+        metrics.incr("attribute_reads")
+        if self.attributes.has(key, category=category):
+            return self.attributes.get(key, category=category)
+        if category is None:
+            return copy.copy(self.attribute_defaults.get(key))
+        return None
+
+    def set_attribute(self, key, value, category=None):
+        """
+        Store an Attribute, unless it already holds an equal value. Setting
+        an Attribute back to its class default deletes the stored row.
+
+        Args:
+            key (str): Attribute key.
+            value (any): New value.
+            category (str, optional): Attribute category.
+
+        Returns:
+            written (bool): If anything was written to the database.
+
+        """
+        stored = self.attributes.has(key, category=category)
+        if category is None and key in self.attribute_defaults \
+                and value == self.attribute_defaults[key]:
+            if stored:
+                metrics.incr("attribute_writes")
+                self.attributes.remove(key)
+                self.at_attribute_changed(key, category)
+            return stored
+        if stored:
+            if self.attributes.get(key, category=category) == value:
+                return False
+        metrics.incr("attribute_writes")
+        self.attributes.add(key, value, category=category)
+        self.at_attribute_changed(key, category)
+        return True
+
+    def at_attribute_changed(self, key, category=None):
+        """
+        Called after `set_attribute` has written or removed an Attribute.
+
+        Args:
+            key (str): Attribute key.
+            category (str or None): Attribute category.
+
+        """
+        pass
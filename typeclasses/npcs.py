@@ -0,0 +1,51 @@
+"""
+NPCs
+
+A slim Character for the NPCs GMs create with @createnpc. Most of them
+are background extras nobody looks at closely, so until a GM first
+dresses one or gives it nakeds, it has no wardrobe of its own: no
+nakeds or worn Attributes, nothing to migrate, and no rendered body
+cached on the object. Its body is the bare one shared by every other
+untouched NPC with the same body plan and skintone (see
+world/appearance.py).
+
+The first edit (through set_nakeds or set_attribute, as @char and the
+clothing commands do) stores a wardrobe version, and from then on the
+NPC behaves exactly like a Character. Poses, return_appearance and @npc
+orders work the same either way.
+
+"""
+from typeclasses.characters import Character
+
+# Attributes whose presence means the NPC has a wardrobe of its own.
+# "nakeds" is the old, single-dict way of storing nakeds.
+WARDROBE_ATTRIBUTES = ("wardrobe_version", "worn", "nakeds")
+
+
+class NPC(Character):
+    """
+    A Character that only materializes wardrobe and nakeds state when
+    first edited.
+    """
+
+    def has_wardrobe(self):
+        """
+        Returns if this NPC's wardrobe or nakeds were ever edited. Only
+        checks the Attribute cache.
+        """
+        return any(self.attributes.has(key) for key in WARDROBE_ATTRIBUTES)
+
+    def get_naked(self, region):
+        if not self.has_wardrobe():
+            return ""
+        return super().get_naked(region)
+
+    def get_nakeds(self):
+        if not self.has_wardrobe():
+            return dict.fromkeys(self.get_body_plan().regions, "")
+        return super().get_nakeds()
+
+    def get_worn(self):
+        if not self.has_wardrobe():
+            return {}
+        return super().get_worn()
@@ -11,6 +11,9 @@ from evennia import TICKER_HANDLER
 from collections import defaultdict
 from typeclasses.characters import Character
 from config.configlists import DIRGE_INDOOR_AMBIENCE_STRINGS
+from evennia.utils.utils import make_iter
+from world.broadcast import broadcast, buffer_echo, is_coalescing
+from world import metrics
 
 
 class Room(DefaultRoom):
@@ -33,10 +36,7 @@ class Room(DefaultRoom):
             if con.destination:
                 exits.append(key)
             elif con.is_typeclass(Character):
-                if con.db.temp_idlepose:
-                    users.append("|c%s|n %s" % (key, con.db.temp_idlepose))
-                else:
-                    users.append("|c%s|n %s" % (key, con.db.idlepose))
+                users.append("|c%s|n %s" % (key, con.get_pose()))
             else:
                 things[key].append(con)
         string = "|c%s|n\n" % self.get_display_name(looker)
@@ -59,6 +59,60 @@ class Room(DefaultRoom):
             string += "\n|wExits:|n " + ', '.join(exits)
         return string
 
+    def msg_contents(self, text=None, exclude=None, from_obj=None, mapping=None, **kwargs):
+        """
+        While this room coalesces or holds its echoes (see
+        world/broadcast.py), messages are queued in the same buffer, so
+        they go out in the order they were sent relative to the echoes.
+        Otherwise they are sent as usual.
+        """
+        if not is_coalescing(self):
+            return super().msg_contents(text=text, exclude=exclude, from_obj=from_obj,
+                                        mapping=mapping, **kwargs)
+        # like the default, accept an outputcommand on the form (message, {options})
+        is_outcmd = isinstance(text, (tuple, list)) and text
+        message = text[0] if is_outcmd else text
+        options = text[1] if is_outcmd and len(text) > 1 else None
+        exclude = make_iter(exclude) if exclude else ()
+        for obj in self.contents:
+            if obj in exclude or not obj.sessions.count():
+                continue
+            outmessage = message
+            if mapping and isinstance(message, str):
+                outmessage = message.format(**{
+                    key: sub.get_display_name(obj) if hasattr(sub, "get_display_name") else str(sub)
+                    for key, sub in mapping.items()})
+            buffer_echo(self, obj, (outmessage, options) if options else outmessage, from_obj, **kwargs)
+
+    def get_header(self):
+        """
+        Returns the room name and exits line used by brief mode. It is cached
+        on the room and only rebuilt when the room or one of its exits changes
+        name, or an exit is added or removed.
+        """
+        signature = (self.key,) + tuple(ex.key for ex in self.exits)
+        if self.ndb.header_signature != signature:
+            header = "|c%s|n" % self.key
+            if len(signature) > 1:
+                header += "\n|wExits:|n " + ', '.join(signature[1:])
+            self.ndb.header = header
+            self.ndb.header_signature = signature
+        return self.ndb.header
+
+    def return_brief(self, looker):
+        """
+        The cheap version of return_appearance sent on movement to characters
+        in brief mode: room name, exits and how many others are here.
+        """
+        if not looker:
+            return ""
+        occupants = sum(1 for con in self.contents
+                        if con != looker and con.is_typeclass(Character, exact=False))
+        string = self.get_header()
+        if occupants:
+            string += "\n|n%i other%s here." % (occupants, "" if occupants == 1 else "s")
+        return string
+
     def at_look(self, target, **kwargs):
 
         description = target.return_appearance(self, **kwargs)
@@ -94,8 +148,9 @@ class AmbientRoom(Room):
         any arguments and keyword arguments (hence the *args, **kwargs
         even though we don't actually use them in this example)
         """
+        metrics.incr("ticker_callbacks")
         if random.random() < 0.005:
-            self.msg_contents("|w%s|n" % random.choice(self.ambient_strings))
+            broadcast(self, None, "|w%s|n" % random.choice(self.ambient_strings))
 
 
 class DirgeIndoorAmbientRoom(AmbientRoom):
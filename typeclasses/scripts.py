@@ -12,7 +12,13 @@ just overloads its hooks to have it perform its function.
 
 """
 
+import time
+from django.conf import settings
 from evennia import DefaultScript
+from world import behavior
+from world import expiry
+from world import gamestats
+from world import npcs
 
 
 class Script(DefaultScript):
@@ -90,3 +96,96 @@ class Script(DefaultScript):
     """
 
     pass
+
+
+class GameStatsScript(Script):
+    """
+    Recounts the world totals reported over MSSP (see world/gamestats.py)
+    every few minutes, so crawlers never cause a table scan.
+    """
+
+    def at_script_creation(self):
+        self.key = "game_stats"
+        self.desc = "Recounts world totals for MSSP"
+        self.interval = 600
+        self.persistent = True
+
+    def at_repeat(self):
+        gamestats.write_stats(gamestats.compute_stats())
+
+
+class NPCSweeperScript(Script):
+    """
+    Archives or deletes NPCs nobody has used for a while, see
+    `world.npcs.sweep_npcs`. The counts of the last sweep are kept in
+    `db.last_sweep`.
+    """
+
+    def at_script_creation(self):
+        self.key = "npc_sweeper"
+        self.desc = "Sweeps up abandoned NPCs"
+        self.interval = 6 * 3600
+        self.start_delay = True
+        self.persistent = True
+
+    def at_repeat(self):
+        npcs.sweep_npcs(callback=self.at_sweep_done)
+
+    def at_sweep_done(self, counts):
+        self.db.last_sweep = counts
+
+
+class BehaviorEngineScript(Script):
+    """
+    Drives the idle actions of every NPC, see world/behavior.py.
+    """
+
+    def at_script_creation(self):
+        self.key = "npc_behavior"
+        self.desc = "Runs NPC idle actions"
+        self.interval = settings.NPC_IDLE_TICK
+        self.persistent = True
+
+    def at_start(self):
+        behavior.load()
+
+    def at_repeat(self):
+        behavior.tick()
+
+
+class ExpiryScript(Script):
+    """
+    Advances the expiry wheel (see world/expiry.py). Pending entries are
+    saved in `db.snapshot` on reload and shutdown, and every
+    `expiry.SNAPSHOT_TICKS` ticks so a crash loses at most a few minutes
+    of changes. They are put back when the script starts again.
+    """
+
+    def at_script_creation(self):
+        self.key = "expiry"
+        self.desc = "Expires temporary state"
+        self.interval = expiry.TICK
+        self.persistent = True
+
+    def at_start(self):
+        saved = self.attributes.get("snapshot")
+        if saved:
+            saved_at, entries = saved
+            expiry.restore(entries, time.time() - saved_at)
+        self.ndb.ticks = 0
+
+    def at_repeat(self):
+        expiry.tick()
+        self.ndb.ticks = (self.ndb.ticks or 0) + 1
+        if self.ndb.ticks >= expiry.SNAPSHOT_TICKS:
+            self.ndb.ticks = 0
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        self.db.snapshot = (time.time(), expiry.snapshot())
+
+    def at_server_reload(self):
+        self.save_snapshot()
+
+    def at_server_shutdown(self):
+        self.save_snapshot()
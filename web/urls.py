@@ -9,9 +9,14 @@ from django.conf.urls import url, include
 # default evennia patterns
 from evennia.web.urls import urlpatterns
 
+from web import views
+
 # eventual custom patterns
 custom_patterns = [
     # url(r'/desired/url/', view, name='example'),
+    url(r'^metrics/$', views.metrics_view, name='metrics'),
+    url(r'^profiles/(?P<object_id>\d+)/$', views.character_profile, name='character_profile'),
+    url(r'^profiles/(?P<object_id>\d+)/json/$', views.character_profile_json, name='character_profile_json'),
 ]
 
 # this is required by Django.
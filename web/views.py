@@ -0,0 +1,116 @@
+"""
+Custom views for the game website. Hooked up in web/urls.py.
+
+"""
+import hmac
+import zlib
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import condition
+from evennia.objects.models import ObjectDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils.text2html import parse_html
+from world import metrics
+from world.appearance import body_payload, render_body
+
+
+def _metrics_allowed(request):
+    """
+    Staff, or a scraper sending `settings.METRICS_TOKEN` as a bearer token.
+    The peer address is no use here: the Portal proxies every web request
+    to the Server from localhost.
+    """
+    user = getattr(request, "user", None)
+    if user and user.is_authenticated and (user.is_staff or user.is_superuser):
+        return True
+    token = getattr(settings, "METRICS_TOKEN", None)
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not token or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(header[len("Bearer "):].strip(), token)
+
+
+def metrics_view(request):
+    """
+    Server health and hot-path counters in the Prometheus text format.
+    Only for staff, or scrapers with the METRICS_TOKEN. Everything comes
+    from in-memory aggregates (world/metrics.py), so scraping never
+    queries the database.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden("Forbidden")
+    gauges = {"sessions_connected": len(SESSION_HANDLER.get_sessions())}
+    return HttpResponse(metrics.render_prometheus(gauges), content_type="text/plain; version=0.0.4")
+
+
+def _get_character(object_id):
+    """
+    The Character with this id, or None. Goes through the idmapper cache.
+    """
+    obj = ObjectDB.objects.get_id(int(object_id))
+    if obj and obj.is_typeclass("typeclasses.characters.Character", exact=False):
+        return obj
+    return None
+
+
+def _profile_etag(request, object_id, **kwargs):
+    character = _get_character(object_id)
+    if not character:
+        return None
+    # the desc and name aren't part of the wardrobe version, so fold them in
+    extra = zlib.crc32(("%s\n%s" % (character.key, character.db.desc or "")).encode("utf-8"))
+    return "%s-%s-%08x" % (character.id, character.get_wardrobe_version(), extra)
+
+
+def _profile_json_etag(request, object_id, **kwargs):
+    etag = _profile_etag(request, object_id)
+    if not etag:
+        return None
+    # the JSON has the pose too, which changes without touching the wardrobe
+    pose = _get_character(object_id).get_pose() or ""
+    return "%s-%08x" % (etag, zlib.crc32(pose.encode("utf-8")))
+
+
+# No Last-Modified: desc and pose changes aren't timestamped anywhere, so
+# it couldn't move with them. The ETags cover everything shown.
+@login_required
+@condition(etag_func=_profile_etag)
+def character_profile(request, object_id):
+    """
+    A character's description as a web page. The HTML is rendered from the
+    appearance cache and kept until the ETag changes; browsers holding the
+    current ETag get a 304 without anything being rendered.
+    """
+    character = _get_character(object_id)
+    if not character:
+        raise Http404("No such character.")
+    etag = _profile_etag(request, object_id)
+    cached = character.ndb.profile_html_cache
+    if not cached or cached[0] != etag:
+        text = "%s\n%s" % (character.db.desc or "", render_body(character))
+        cached = character.ndb.profile_html_cache = (etag, parse_html(text))
+    return render(request, "website/character_profile.html",
+                  {"character": character, "description": cached[1]})
+
+
+@login_required
+@condition(etag_func=_profile_json_etag)
+def character_profile_json(request, object_id):
+    """
+    A character's description as JSON: name, desc, pose and the per-region
+    body from `world.appearance.body_payload`. Texts keep Evennia markup.
+    """
+    character = _get_character(object_id)
+    if not character:
+        raise Http404("No such character.")
+    return JsonResponse({
+        "id": character.id,
+        "name": character.key,
+        "desc": character.db.desc or "",
+        "pose": character.get_pose(),
+        "skintone": character.get_attribute("skintone"),
+        "version": character.get_wardrobe_version(),
+        "body": body_payload(character),
+    })
@@ -0,0 +1,249 @@
+"""
+Appearance
+
+Works out what of a character's body and wardrobe can be seen. Worn
+clothing is kept per region as a stack, outermost layer last. Looking
+at a region walks its stack from the outside in: every garment passed
+is visible, and the walk stops at the first opaque (not see-through)
+garment. If no opaque garment is found, the skin (the naked) shows
+too. A garment covering several regions is only shown once, at the
+first region it is seen on, but still hides what's under it elsewhere.
+
+The rendered body text is cached on the character per wardrobe
+version (see `Character.bump_wardrobe_version`), so the layers are only
+walked again after something the description depends on has changed.
+Characters without a wardrobe of their own (untouched slim NPCs, see
+typeclasses/npcs.py) share one bare render per body plan and skintone
+instead of each caching a copy.
+
+The same information is also available as structured payloads for the
+webclient (see `character_payload`/`room_payload` and the `appearance`
+inputfunc in server/conf/inputfuncs.py). A payload is split into parts,
+each with a version stamp; a client that sends back the versions it
+already has only gets the parts that changed. Texts in payloads keep
+their Evennia color markup.
+
+"""
+import json
+import zlib
+from world import metrics
+
+# {(kind, body plan, skintone): render} for characters without a wardrobe
+_BARE_CACHE = {}
+
+def resolve_layers(regions, worn, is_opaque):
+    """
+    Walk each region's clothing stack once.
+
+    Args:
+        regions (iterable): Region names, in description order.
+        worn (dict): `{region: [garment, ...]}`, outermost layer last.
+        is_opaque (callable): `is_opaque(garment)` returns True if nothing
+            under the garment can be seen. Called at most once per garment.
+
+    Returns:
+        layers (list): One `(region, garments, skin_visible)` tuple per
+            region, in order. `garments` lists the garments first seen at
+            this region, outermost first.
+
+    """
+    shown = set()
+    opaque = {}
+    layers = []
+    for region in regions:
+        garments = []
+        skin_visible = True
+        for garment in reversed(worn.get(region, ())):
+            if garment not in shown:
+                shown.add(garment)
+                garments.append(garment)
+            if garment not in opaque:
+                opaque[garment] = is_opaque(garment)
+            if opaque[garment]:
+                skin_visible = False
+                break
+        layers.append((region, garments, skin_visible))
+    return layers
+
+
+def render_body(character):
+    """
+    Render the naked and clothing part of a character's description.
+
+    Args:
+        character (Character): The character to render.
+
+    Returns:
+        string (str): The rendered text, taken from the cache if the
+            character's wardrobe hasn't changed since it was rendered.
+
+    """
+    if not character.has_wardrobe():
+        return _bare(character, "text", _render_body)
+    version = character.get_wardrobe_version()
+    cached = character.ndb.appearance_cache
+    if cached and cached[0] == version:
+        metrics.incr("appearance_cache_hits")
+        return cached[1]
+    metrics.incr("appearance_cache_misses")
+    string = _render_body(character)
+    character.ndb.appearance_cache = (version, string)
+    return string
+
+
+def _bare(character, kind, render):
+    """
+    The shared render for a character without a wardrobe of its own.
+    """
+    key = (kind, character.get_attribute("body_plan"), character.get_attribute("skintone"))
+    if key in _BARE_CACHE:
+        metrics.incr("appearance_cache_hits")
+        return _BARE_CACHE[key]
+    metrics.incr("appearance_cache_misses")
+    _BARE_CACHE[key] = render(character)
+    return _BARE_CACHE[key]
+
+
+def _render_body(character):
+    plan = character.get_body_plan()
+    nakeds = character.get_nakeds()
+    skintone = character.get_attribute("skintone")
+    layers = resolve_layers(plan.regions, character.get_worn(),
+                            lambda garment: not garment.get_attribute("seethru"))
+    string = ""
+    for index, (naked_name, garments, skin_visible) in enumerate(layers):
+        naked_value = nakeds[naked_name]
+        # Possible I'm breaking this with the expanded check for empty string
+        string += '\n\n' if (index in plan.paragraph_breaks and naked_value != '') else ''
+        for garment in garments:
+            string += '%s ' % garment.get_worn_message()
+        if skin_visible:
+            string += '%s%s|n ' % (skintone, naked_value)
+    return string
+
+
+def _stamp(value):
+    """
+    Content-derived version stamp for payload parts without a counter.
+    """
+    return "%08x" % zlib.crc32(json.dumps(value, sort_keys=True).encode("utf-8"))
+
+
+def body_payload(character):
+    """
+    The structured version of `render_body`: one entry per region with its
+    naked, the garments visible there and if the skin shows. Cached per
+    wardrobe version, like the rendered text.
+
+    Args:
+        character (Character): The character to describe.
+
+    Returns:
+        regions (list): `[{"region", "naked", "garments", "skin_visible"}, ...]`,
+            where garments are `{"id", "key", "state", "worn"}` dicts.
+
+    """
+    if not character.has_wardrobe():
+        return _bare(character, "payload", _body_payload)
+    version = character.get_wardrobe_version()
+    cached = character.ndb.appearance_payload_cache
+    if cached and cached[0] == version:
+        metrics.incr("appearance_cache_hits")
+        return cached[1]
+    metrics.incr("appearance_cache_misses")
+    regions = _body_payload(character)
+    character.ndb.appearance_payload_cache = (version, regions)
+    return regions
+
+
+def _body_payload(character):
+    nakeds = character.get_nakeds()
+    layers = resolve_layers(character.get_body_plan().regions, character.get_worn(),
+                            lambda garment: not garment.get_attribute("seethru"))
+    regions = []
+    for naked_name, garments, skin_visible in layers:
+        regions.append({
+            "region": naked_name,
+            "naked": nakeds[naked_name] if skin_visible else "",
+            "garments": [{"id": garment.id, "key": garment.key, "state": garment.get_state(),
+                          "worn": garment.get_worn_message()} for garment in garments],
+            "skin_visible": skin_visible,
+        })
+    return regions
+
+
+def build_payload(kind, obj, parts, known=None):
+    """
+    Assemble a payload from versioned parts, leaving out the ones the
+    client already has.
+
+    Args:
+        kind (str): "character" or "room".
+        obj (Object): The object described.
+        parts (dict): `{name: (version, getter)}`. Getters are only
+            called for parts the client doesn't have.
+        known (dict, optional): `{name: version}` the client has cached.
+
+    Returns:
+        payload (dict): `{"kind", "id", "versions", "parts"}`.
+
+    """
+    known = known or {}
+    payload = {"kind": kind, "id": obj.id, "versions": {}, "parts": {}}
+    for name, (version, getter) in parts.items():
+        value = None
+        if version is None:
+            value = getter()
+            version = _stamp(value)
+        payload["versions"][name] = version
+        if known.get(name) != version:
+            payload["parts"][name] = value if value is not None else getter()
+    return payload
+
+
+def character_payload(character, looker, known=None):
+    """
+    Structured appearance of a character.
+
+    Args:
+        character (Character): Who is looked at.
+        looker (Object): Who is looking.
+        known (dict, optional): Part versions the client already has.
+
+    Returns:
+        payload (dict): See `build_payload`. Parts are "name", "desc",
+            "pose", "skintone" and "body" (see `body_payload`).
+
+    """
+    return build_payload("character", character, {
+        "name": (None, lambda: character.get_display_name(looker)),
+        "desc": (None, lambda: character.db.desc or ""),
+        "pose": (None, character.get_pose),
+        "skintone": (None, lambda: character.get_attribute("skintone")),
+        "body": (character.get_wardrobe_version(), lambda: body_payload(character)),
+    }, known)
+
+
+def room_payload(room, looker, known=None):
+    """
+    Structured appearance of a room.
+
+    Args:
+        room (Room): The room looked at.
+        looker (Object): Who is looking.
+        known (dict, optional): Part versions the client already has.
+
+    Returns:
+        payload (dict): See `build_payload`. Parts are "name", "desc",
+            "exits" and "occupants" (`{"id", "name", "pose"}` dicts).
+
+    """
+    visible = [con for con in room.contents if con != looker and con.access(looker, "view")]
+    return build_payload("room", room, {
+        "name": (None, lambda: room.get_display_name(looker)),
+        "desc": (None, lambda: room.db.desc or ""),
+        "exits": (None, lambda: [{"id": con.id, "name": con.get_display_name(looker)}
+                                 for con in visible if con.destination]),
+        "occupants": (None, lambda: [{"id": con.id, "name": con.get_display_name(looker), "pose": con.get_pose()}
+                                     for con in visible if hasattr(con, "get_pose")]),
+    }, known)
@@ -0,0 +1,146 @@
+"""
+Behavior
+
+The idle behavior engine: NPCs given idle actions with @npc/idle do
+one of them every now and then, like "emote looks around" or
+"@char temp-idle = leans on the bar.". Actions are ordinary commands,
+run by the NPC itself.
+
+Every NPC with idle actions sits in one shared timing wheel (see
+world/timingwheel.py) that the `BehaviorEngineScript` advances every
+`NPC_IDLE_TICK` seconds; there are no per-NPC timers. On each tick,
+the NPCs that are due are handled as one batch, with echoes held per
+room (see `world.broadcast.hold_echoes`) so each room gets one message
+per tick. NPCs in rooms nobody is listening in are skipped and
+rescheduled without running anything.
+
+Under load the engine backs off: a tick stops after
+`NPC_IDLE_BUDGET_MS` milliseconds and pushes the rest to the next tick,
+and while ticks keep running over budget, NPCs are rescheduled further
+out (up to `MAX_BACKOFF` times their interval).
+
+"""
+import random
+import time
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from world import metrics
+from world.broadcast import hold_echoes, release_echoes
+from world.timingwheel import TimingWheel
+
+# Tag marking NPCs with idle actions, so the engine finds them at start.
+IDLE_TAG = "idle"
+IDLE_CATEGORY = "npc_behavior"
+# Seconds between idle actions, if the NPC doesn't set its own.
+DEFAULT_INTERVAL = 120
+MAX_BACKOFF = 8
+
+_WHEEL = TimingWheel(size=128, tick=settings.NPC_IDLE_TICK)
+_BACKOFF = [1]
+
+
+def _jittered(interval):
+    """
+    Spread NPCs out, so ones scheduled together don't stay in step.
+    """
+    return interval * _BACKOFF[0] * random.uniform(0.75, 1.25)
+
+
+def schedule(npc):
+    """
+    Put an NPC with idle actions on the wheel.
+    """
+    interval = npc.attributes.get("idle_interval", default=DEFAULT_INTERVAL)
+    _WHEEL.add(npc.id, _jittered(interval), npc)
+
+
+def unschedule(npc):
+    """
+    Take an NPC off the wheel.
+    """
+    _WHEEL.remove(npc.id)
+
+
+def set_idle_actions(npc, actions, interval=None):
+    """
+    Give an NPC idle actions, or take them away with an empty list.
+
+    Args:
+        npc (Character): The NPC.
+        actions (list): Commands for the NPC to pick from.
+        interval (int, optional): Average seconds between actions.
+
+    """
+    if actions:
+        npc.attributes.add("idle_actions", list(actions))
+        if interval:
+            npc.attributes.add("idle_interval", interval)
+        npc.tags.add(IDLE_TAG, category=IDLE_CATEGORY)
+        schedule(npc)
+    else:
+        npc.attributes.remove("idle_actions")
+        npc.attributes.remove("idle_interval")
+        npc.tags.remove(IDLE_TAG, category=IDLE_CATEGORY)
+        unschedule(npc)
+
+
+def load():
+    """
+    Schedule every NPC with idle actions. Called when the engine starts.
+    """
+    for npc in ObjectDB.objects.filter(db_tags__db_key=IDLE_TAG, db_tags__db_category=IDLE_CATEGORY):
+        schedule(npc)
+    return len(_WHEEL)
+
+
+def _has_listeners(location):
+    return any(con.sessions.count() for con in location.contents)
+
+
+def tick():
+    """
+    Advance the wheel one tick and run the NPCs that are due.
+
+    Returns:
+        acted (int): How many NPCs did something.
+
+    """
+    metrics.incr("ticker_callbacks")
+    due = _WHEEL.advance()
+    if not due:
+        return 0
+    start = time.perf_counter()
+    budget = settings.NPC_IDLE_BUDGET_MS / 1000.0
+    listening = {}
+    held = []
+    acted = 0
+    try:
+        for index, (npcid, npc) in enumerate(due):
+            if time.perf_counter() - start > budget:
+                # out of time, the rest go in the next tick
+                for npcid, npc in due[index:]:
+                    _WHEEL.add(npcid, 0, npc)
+                break
+            if not npc.pk:
+                continue
+            location = npc.location
+            if location and location not in listening:
+                listening[location] = _has_listeners(location)
+            if location and listening[location]:
+                actions = npc.attributes.get("idle_actions")
+                if not actions:
+                    continue
+                if location not in held:
+                    hold_echoes(location)
+                    held.append(location)
+                npc.execute_cmd(random.choice(actions))
+                acted += 1
+            schedule(npc)
+    finally:
+        for location in held:
+            release_echoes(location)
+    if time.perf_counter() - start > budget:
+        _BACKOFF[0] = min(_BACKOFF[0] * 2, MAX_BACKOFF)
+    elif _BACKOFF[0] > 1:
+        _BACKOFF[0] //= 2
+    return acted
@@ -0,0 +1,140 @@
+"""
+Body plans
+
+The body plans in `config.configlists.BODY_PLANS` are compiled once, when
+this module is first imported at server start, into `BodyPlan` lookup
+tables. Each region gets a fixed index, groups are expanded (recursively)
+into tuples of region indices, and the paragraph breaks used when
+rendering descriptions become a set of indices. Coverage checks and
+rendering then only do dict and tuple lookups.
+
+    plan = get_body_plan("human")
+    plan.expand("arms")  # -> ('left-upperarm', 'right-upperarm', ...)
+
+"""
+from config.configlists import BODY_PLANS, DEFAULT_BODY_PLAN
+
+
+class BodyPlan(object):
+    """
+    A compiled body plan.
+
+    Attributes:
+        name (str): Plan name.
+        regions (tuple): Region names in description order.
+        index (dict): `{region: index}`.
+        groups (dict): `{group: (index, ...)}` with nested groups expanded.
+        paragraph_breaks (frozenset): Indices of regions that start a paragraph.
+
+    """
+
+    __slots__ = ("name", "regions", "index", "groups", "paragraph_breaks")
+
+    def __init__(self, name, regions, groups, paragraphs):
+        self.name = name
+        self.regions = tuple(regions)
+        self.index = {region: i for i, region in enumerate(self.regions)}
+        self.groups = {}
+        for group in groups:
+            self.groups[group] = tuple(sorted(self._expand_group(group, groups, ())))
+        self.paragraph_breaks = frozenset(self.index[region] for region in paragraphs)
+
+    def _expand_group(self, group, groups, seen):
+        if group in seen:
+            raise ValueError("Body plan %s: group %s includes itself." % (self.name, group))
+        indices = set()
+        for member in groups[group]:
+            if member in self.index:
+                indices.add(self.index[member])
+            elif member in groups:
+                indices.update(self._expand_group(member, groups, seen + (group,)))
+            else:
+                raise ValueError("Body plan %s: unknown region or group %s." % (self.name, member))
+        return indices
+
+    def __contains__(self, region):
+        return region in self.index
+
+    def expand(self, name):
+        """
+        Resolve a region or group name to region names.
+
+        Args:
+            name (str): A region or group name.
+
+        Returns:
+            regions (tuple or None): The regions, in description order, or
+                `None` if `name` is neither a region nor a group of this plan.
+
+        """
+        if name in self.index:
+            return (name,)
+        indices = self.groups.get(name)
+        if indices is None:
+            return None
+        return tuple(self.regions[i] for i in indices)
+
+
+def compile_body_plans(definitions):
+    """
+    Compile body plan definitions into `BodyPlan`s.
+
+    Args:
+        definitions (dict): `{name: definition}` as in `BODY_PLANS`.
+
+    Returns:
+        plans (dict): `{name: BodyPlan}`.
+
+    """
+    resolved = {}
+
+    def resolve(name, seen=()):
+        if name in resolved:
+            return resolved[name]
+        if name in seen:
+            raise ValueError("Body plan %s inherits from itself." % name)
+        definition = definitions[name]
+        if "parent" in definition:
+            parent = resolve(definition["parent"], seen + (name,))
+            regions = list(parent["regions"]) + list(definition.get("extra_regions", ()))
+            groups = dict(parent["groups"])
+            groups.update(definition.get("groups", {}))
+            paragraphs = definition.get("paragraphs", parent["paragraphs"])
+        else:
+            regions = list(definition["regions"])
+            groups = dict(definition.get("groups", {}))
+            paragraphs = definition.get("paragraphs", ())
+        resolved[name] = {"regions": regions, "groups": groups, "paragraphs": paragraphs}
+        return resolved[name]
+
+    plans = {}
+    for name in definitions:
+        definition = resolve(name)
+        plans[name] = BodyPlan(name, definition["regions"], definition["groups"],
+                               definition["paragraphs"])
+    return plans
+
+
+_BODY_PLANS = compile_body_plans(BODY_PLANS)
+
+
+def get_body_plan(name=None):
+    """
+    Get a compiled body plan.
+
+    Args:
+        name (str, optional): Plan name. Unknown or missing names give the
+            default plan.
+
+    Returns:
+        plan (BodyPlan): The plan.
+
+    """
+    return _BODY_PLANS.get(name) or _BODY_PLANS[DEFAULT_BODY_PLAN]
+
+
+def body_plan_names():
+    """
+    Returns the names of all available body plans.
+    """
+    return sorted(_BODY_PLANS)
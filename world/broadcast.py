@@ -0,0 +1,198 @@
+"""
+Broadcast
+
+Room echoes about an actor ("Bob drops a shirt.") are sent through
+`broadcast` instead of `msg_contents`/`for_contents`. The actor's
+display name is resolved once per recipient, recipients that see the
+same name are grouped together and each variant of the echo is only
+formatted once before being sent to its group.
+
+Rooms can opt in to echo coalescing by setting the `coalesce_echoes`
+Attribute (`@set here/coalesce_echoes = True`). Echoes broadcast into
+such a room are buffered for `COALESCE_DELAY` seconds and then flushed
+as a single message per recipient, in the order they were emitted.
+
+Code running a batch of actions in a room (like the NPC order queue in
+world/npcs.py) can also hold a room's echoes with `hold_echoes` and send
+them all in one flush with `release_echoes`, whether the room coalesces
+or not.
+
+While a room coalesces or is held, everything else said in it is queued
+in the same buffer, so it keeps its place among the echoes: the room's
+`msg_contents` (say, pose and friends, see `Room.msg_contents`) and
+presence events (world/presence.py). Consecutive plain text echoes to a
+recipient are joined into one message; anything with message options,
+like a say's type or a presence event, is sent on its own in between.
+
+"""
+from collections import OrderedDict
+from evennia.utils.utils import delay
+from world import metrics
+
+# How long (in seconds) a coalescing room buffers echoes before flushing.
+COALESCE_DELAY = 0.005
+
+
+def _resolve_exclude(exclude):
+    if not exclude:
+        return set()
+    if not isinstance(exclude, (list, tuple, set)):
+        exclude = [exclude]
+    return set(exclude)
+
+
+def group_recipients(location, actor=None, exclude=None):
+    """
+    Group the listening contents of `location` by how they see `actor`.
+
+    Args:
+        location (Object): The room (or container) holding the recipients.
+        actor (Object, optional): The object the echo is about. If not
+            given, all recipients end up in a single group.
+        exclude (Object or list, optional): Objects to leave out.
+
+    Returns:
+        groups (OrderedDict): `{display_name: [recipient, ...]}`, in the
+            order the names were first seen. The key is `None` when no
+            actor was given.
+
+    """
+    exclude = _resolve_exclude(exclude)
+    groups = OrderedDict()
+    for obj in location.contents:
+        if obj in exclude or not obj.sessions.count():
+            # nobody is listening through this object
+            continue
+        name = actor.get_display_name(obj) if actor else None
+        groups.setdefault(name, []).append(obj)
+    return groups
+
+
+def is_coalescing(location):
+    """
+    Returns if echoes in `location` are buffered right now, because the
+    room coalesces echoes or someone is holding them.
+    """
+    return bool(location.ndb.echo_hold or location.attributes.get("coalesce_echoes", default=False))
+
+
+def broadcast(location, actor, message, exclude=None, from_obj=None):
+    """
+    Echo a message about `actor` to everyone in `location`.
+
+    Args:
+        location (Object): The room to echo to. Nothing happens if `None`.
+        actor (Object or None): The object the echo is about. Its display
+            name, as seen by each recipient, is put in front of `message`.
+            If `None`, `message` is sent as-is.
+        message (str): The rest of the echo, e.g. "drops a shirt.".
+        exclude (Object or list, optional): Objects that should not
+            receive the echo, usually the actor itself.
+        from_obj (Object, optional): Passed on to each recipient's `msg`.
+            Defaults to `actor`.
+
+    Returns:
+        sent (int): The number of recipients the echo was sent to.
+
+    """
+    if not location:
+        return 0
+    if from_obj is None:
+        from_obj = actor
+    coalesce = is_coalescing(location)
+    sent = 0
+    for name, recipients in group_recipients(location, actor, exclude).items():
+        text = "%s %s" % (name, message) if actor else message
+        for obj in recipients:
+            if coalesce:
+                buffer_echo(location, obj, text, from_obj)
+            else:
+                obj.msg(text, from_obj=from_obj)
+        sent += len(recipients)
+    if not coalesce:
+        metrics.incr("messages_sent", sent)
+    return sent
+
+
+def buffer_echo(location, obj, text, from_obj, **kwargs):
+    """
+    Queue an echo on a coalescing or held room, scheduling a flush if
+    this is the first echo of the burst and nobody is holding the room.
+    `text` and any `kwargs` are what would have been passed to `obj.msg`.
+    """
+    buffer = location.ndb.echo_buffer
+    if buffer is None:
+        buffer = location.ndb.echo_buffer = []
+        if not location.ndb.echo_hold:
+            delay(COALESCE_DELAY, flush_echoes, location)
+    buffer.append((obj, text, from_obj, kwargs))
+
+
+def hold_echoes(location):
+    """
+    Buffer every echo in `location` until `release_echoes` is called.
+    Holds nest; the echoes are flushed when the last one is released.
+    """
+    location.ndb.echo_hold = (location.ndb.echo_hold or 0) + 1
+
+
+def release_echoes(location):
+    """
+    Release a hold on `location`, flushing its buffered echoes if it was
+    the last one.
+
+    Returns:
+        flushed (int): The number of recipients that got a message.
+
+    """
+    hold = (location.ndb.echo_hold or 1) - 1
+    location.ndb.echo_hold = hold or None
+    if hold:
+        return 0
+    return flush_echoes(location)
+
+
+def flush_echoes(location):
+    """
+    Send everything buffered on `location` as one message per recipient.
+
+    Args:
+        location (Object): The coalescing room to flush.
+
+    Returns:
+        flushed (int): The number of recipients that got a message.
+
+    """
+    buffer = location.ndb.echo_buffer
+    location.ndb.echo_buffer = None
+    if not buffer:
+        return 0
+    frames = OrderedDict()
+    for obj, text, from_obj, kwargs in buffer:
+        frames.setdefault(obj, []).append((text, from_obj, kwargs))
+    sent = 0
+    for obj, entries in frames.items():
+        run = []
+        for entry in entries:
+            text, from_obj, kwargs = entry
+            if isinstance(text, str) and not kwargs:
+                run.append(entry)
+                continue
+            sent += _send_run(obj, run)
+            run = []
+            obj.msg(text=text, from_obj=from_obj, **kwargs)
+            sent += 1
+        sent += _send_run(obj, run)
+    metrics.incr("messages_sent", sent)
+    return len(frames)
+
+
+def _send_run(obj, run):
+    """
+    Send consecutive plain text echoes to `obj` as one message.
+    """
+    if not run:
+        return 0
+    senders = set(from_obj for _, from_obj, _ in run)
+    obj.msg("\n".join(text for text, _, _ in run), from_obj=run[0][1] if len(senders) == 1 else None)
+    return 1
@@ -0,0 +1,110 @@
+"""
+Expiry
+
+Timed, short-lived state, like a temp-idle pose that clears itself
+after a while. Entries live in one timing wheel (see
+world/timingwheel.py) advanced by the `ExpiryScript`
+(typeclasses/scripts.py) every `TICK` seconds, instead of one Script or
+delay per timer, so thousands of them cost next to nothing.
+
+An entry is an object and the name of an action in `ACTIONS`, which is
+called with the object when the entry expires. Scheduling the same
+action on the same object again replaces the earlier entry.
+
+    expiry.expire_later(character, "clear_temp_idlepose", 1800)
+
+Only ids, action names and plain arguments are kept, so the whole wheel
+fits in a small snapshot. The ExpiryScript saves one on reload and
+shutdown, and every `SNAPSHOT_TICKS` ticks in case the server crashes,
+and restores it when it starts again.
+
+"""
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from world import presence
+from world.timingwheel import TimingWheel
+
+# Seconds per tick. Entries expire up to one tick late.
+TICK = 10
+
+# Ticks between the snapshots saved in case of a crash (5 minutes).
+SNAPSHOT_TICKS = 30
+
+_WHEEL = TimingWheel(size=512, tick=TICK)
+
+
+def clear_temp_idlepose(obj):
+    # the timeout counts from the last command, not from setting the pose;
+    # rather than rescheduling on every command, check when it runs out
+    idle = obj.idle_time
+    timeout = settings.TEMP_IDLEPOSE_TIMEOUT
+    if idle is not None and idle < timeout:
+        expire_later(obj, "clear_temp_idlepose", timeout - idle)
+        return
+    if obj.set_attribute("temp_idlepose", ""):
+        presence.emit(obj.location, "pose", obj)
+
+
+# {name: callable(obj, *args)}
+ACTIONS = {
+    "clear_temp_idlepose": clear_temp_idlepose,
+}
+
+
+def expire_later(obj, action, seconds, *args):
+    """
+    Run an action on an object after a while.
+
+    Args:
+        obj (Object): The object.
+        action (str): A key of `ACTIONS`.
+        seconds (float): How long to wait.
+        *args: Extra (picklable) arguments for the action.
+
+    """
+    _WHEEL.add((obj.id, action), seconds, args)
+
+
+def cancel(obj, action):
+    """
+    Drop a pending action, if there is one.
+    """
+    _WHEEL.remove((obj.id, action))
+
+
+def remaining(obj, action):
+    """
+    Seconds until the action runs, or None if it isn't pending.
+    """
+    return _WHEEL.remaining((obj.id, action))
+
+
+def tick():
+    """
+    Advance the wheel one tick and run whatever expired.
+
+    Returns:
+        expired (int): How many actions ran.
+
+    """
+    expired = _WHEEL.advance()
+    for (objid, action), args in expired:
+        obj = ObjectDB.objects.get_id(objid)
+        if obj:
+            ACTIONS[action](obj, *args)
+    return len(expired)
+
+
+def snapshot():
+    """
+    All pending entries, as `[((objid, action), seconds, args), ...]`.
+    """
+    return _WHEEL.snapshot()
+
+
+def restore(entries, elapsed=0):
+    """
+    Re-schedule the entries of a `snapshot` taken `elapsed` seconds ago.
+    Actions that no longer exist are dropped.
+    """
+    _WHEEL.restore([entry for entry in entries if entry[0][1] in ACTIONS], elapsed)
@@ -0,0 +1,92 @@
+"""
+Game stats
+
+World totals for the MSSP listing (see server/conf/mssp.py). Counting
+means scanning the object table, so it is never done when a crawler
+asks; the `GameStatsScript` (typeclasses/scripts.py) recounts every
+ten minutes and writes the totals to `STATS_FILE`.
+
+MSSP is answered by the Portal, which has no access to the Server's
+memory, so the totals go through a small JSON file. `read_stats` only
+re-reads the file when it has changed on disk.
+
+"""
+import json
+import os
+from django.conf import settings
+
+STATS_FILE = os.path.join(settings.GAME_DIR, "server", "gamestats.json")
+
+ROOM_TYPECLASSES = "typeclasses.rooms."
+CHARACTER_TYPECLASSES = ("typeclasses.characters.Character", "typeclasses.npcs.NPC")
+
+_CACHE = {"mtime": None, "stats": {}}
+
+
+def compute_stats():
+    """
+    Count everything in one pass over the object table.
+
+    Returns:
+        stats (dict): `{"rooms", "exits", "npcs", "objects", "accounts",
+            "dbsize"}`. NPCs archived by the NPC sweeper (world/npcs.py)
+            are not counted as NPCs. "objects" are things, like clothing:
+            everything that isn't a room, exit or character. `dbsize` is
+            the MSSP meaning: rooms, exits, objects, mobiles and players
+            all together.
+
+    """
+    from django.db.models import Count, Q
+    from evennia.accounts.models import AccountDB
+    from evennia.objects.models import ObjectDB
+    from world.npcs import ARCHIVE_CATEGORY, NPC_LOCK
+
+    archived = ObjectDB.objects.filter(db_tags__db_key="archived", db_tags__db_category=ARCHIVE_CATEGORY)
+    is_room = Q(db_typeclass_path__startswith=ROOM_TYPECLASSES)
+    is_exit = Q(db_destination__isnull=False)
+    is_character = Q(db_typeclass_path__in=CHARACTER_TYPECLASSES) | Q(db_lock_storage__contains=NPC_LOCK)
+    stats = ObjectDB.objects.aggregate(
+        total=Count("id"),
+        rooms=Count("id", filter=is_room),
+        exits=Count("id", filter=is_exit & ~is_room),
+        npcs=Count("id", filter=Q(db_lock_storage__contains=NPC_LOCK) & ~Q(id__in=archived.values("id"))),
+        objects=Count("id", filter=~is_room & ~is_exit & ~is_character))
+    stats["accounts"] = AccountDB.objects.count()
+    stats["dbsize"] = stats.pop("total") + stats["accounts"]
+    return stats
+
+
+def write_stats(stats):
+    """
+    Save the totals for the Portal. The file is replaced in one go, so a
+    crawl never sees it half written.
+    """
+    tmpname = STATS_FILE + ".tmp"
+    with open(tmpname, "w") as tmpfile:
+        json.dump(stats, tmpfile)
+    os.replace(tmpname, STATS_FILE)
+
+
+def read_stats():
+    """
+    The last saved totals, or an empty dict if there are none yet.
+    """
+    try:
+        mtime = os.stat(STATS_FILE).st_mtime
+    except OSError:
+        return {}
+    if mtime != _CACHE["mtime"]:
+        try:
+            with open(STATS_FILE) as statsfile:
+                _CACHE["stats"] = json.load(statsfile)
+        except (OSError, ValueError):
+            return _CACHE["stats"]
+        _CACHE["mtime"] = mtime
+    return _CACHE["stats"]
+
+
+def stat(name):
+    """
+    A callable for an MSSP table entry, giving the saved total as a string.
+    """
+    return lambda: str(read_stats().get(name, 0))
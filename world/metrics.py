@@ -0,0 +1,221 @@
+"""
+Metrics
+
+In-memory performance aggregates. Nothing in here touches the database,
+so reading the numbers (with `@perf`, for example) is always cheap.
+
+Command timing: commands inheriting from `commands.command.Command` or
+`commands.command.MuxCommand` call `command_started`/`command_finished`
+from their `at_pre_cmd`/`at_post_cmd`. When timing is off (the default,
+see `COMMAND_PERF_ENABLED` in settings) that is a single boolean check.
+When on, each command's run time and number of database queries go into
+a per-command histogram.
+
+Query counting uses a Django execute wrapper installed on the main
+thread's database connection while timing is on.
+
+Hot paths also bump plain counters with `incr` (a dict increment, so
+they are always on). `render_prometheus` turns all of it into the
+Prometheus text format, served by the metrics view in web/views.py.
+
+Counters:
+    appearance_cache_hits, appearance_cache_misses - render_body/body_payload
+    ticker_callbacks - ticker-driven callbacks, like room ambience
+    messages_sent - messages sent by broadcast and presence events
+    attribute_reads, attribute_writes - TrackedAttributesMixin get/set_attribute
+
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+
+# Upper bounds (in milliseconds) of the command latency histogram buckets.
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+_ENABLED = [False]
+_QUERIES = [0]
+
+
+class CommandStats(object):
+    """
+    Latency histogram and query totals for one command.
+    """
+
+    __slots__ = ("key", "calls", "buckets", "total_ms", "max_ms", "queries", "max_queries")
+
+    def __init__(self, key):
+        self.key = key
+        self.calls = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+
+    def add(self, ms, queries):
+        self.calls += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, ms)] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+
+    def percentile(self, fraction):
+        """
+        Estimated latency (ms) below which `fraction` of calls fall. This is
+        the upper bound of the histogram bucket, capped at the slowest call.
+        """
+        if not self.calls:
+            return 0.0
+        wanted = fraction * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    @property
+    def mean_queries(self):
+        return float(self.queries) / self.calls if self.calls else 0.0
+
+
+COMMAND_STATS = {}
+COUNTERS = defaultdict(int)
+
+
+def incr(name, amount=1):
+    """
+    Bump a counter.
+    """
+    COUNTERS[name] += amount
+
+
+def _count_query(execute, sql, params, many, context):
+    _QUERIES[0] += 1
+    return execute(sql, params, many, context)
+
+
+def perf_enabled():
+    """
+    Returns if command timing is on.
+    """
+    return _ENABLED[0]
+
+
+def set_perf_enabled(enabled):
+    """
+    Turn command timing (and query counting) on or off.
+    """
+    enabled = bool(enabled)
+    if enabled == _ENABLED[0]:
+        return
+    if enabled:
+        connection.execute_wrappers.append(_count_query)
+    elif _count_query in connection.execute_wrappers:
+        connection.execute_wrappers.remove(_count_query)
+    _ENABLED[0] = enabled
+
+
+def command_started(cmd):
+    """
+    Called from a command's at_pre_cmd.
+    """
+    if _ENABLED[0]:
+        cmd._perf_start = (time.perf_counter(), _QUERIES[0])
+
+
+def command_finished(cmd):
+    """
+    Called from a command's at_post_cmd.
+    """
+    start = getattr(cmd, "_perf_start", None)
+    if not start:
+        return
+    cmd._perf_start = None
+    ms = (time.perf_counter() - start[0]) * 1000.0
+    stats = COMMAND_STATS.get(cmd.key)
+    if stats is None:
+        stats = COMMAND_STATS[cmd.key] = CommandStats(cmd.key)
+    stats.add(ms, _QUERIES[0] - start[1])
+
+
+def top_commands(count=10, sort="p95"):
+    """
+    The slowest commands.
+
+    Args:
+        count (int): How many to return.
+        sort (str): "p50", "p95", "p99", "max", "total" or "queries".
+
+    Returns:
+        stats (list): `CommandStats`, worst first.
+
+    """
+    sortkeys = {
+        "p50": lambda stats: stats.percentile(0.5),
+        "p95": lambda stats: stats.percentile(0.95),
+        "p99": lambda stats: stats.percentile(0.99),
+        "max": lambda stats: stats.max_ms,
+        "total": lambda stats: stats.total_ms,
+        "queries": lambda stats: stats.mean_queries,
+    }
+    return sorted(COMMAND_STATS.values(), key=sortkeys[sort], reverse=True)[:count]
+
+
+def reset_commands():
+    """
+    Forget all command timings.
+    """
+    COMMAND_STATS.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(gauges=None):
+    """
+    All metrics in the Prometheus text exposition format.
+
+    Args:
+        gauges (dict, optional): Extra `{name: value}` gauges to include,
+            like the number of connected sessions.
+
+    Returns:
+        text (str): The metrics, prefixed with `dust_`.
+
+    """
+    lines = []
+    # copy first; the web server calls this from another thread
+    counters = dict(COUNTERS)
+    for name in sorted(counters):
+        lines.append("# TYPE dust_%s_total counter" % name)
+        lines.append("dust_%s_total %d" % (name, counters[name]))
+    for name, value in sorted((gauges or {}).items()):
+        lines.append("# TYPE dust_%s gauge" % name)
+        lines.append("dust_%s %s" % (name, value))
+    lines.append("# TYPE dust_command_perf_enabled gauge")
+    lines.append("dust_command_perf_enabled %d" % _ENABLED[0])
+    stats_list = list(COMMAND_STATS.values())
+    if stats_list:
+        lines.append("# HELP dust_command_latency_ms Command run time in milliseconds.")
+        lines.append("# TYPE dust_command_latency_ms histogram")
+        for stats in stats_list:
+            label = 'command="%s"' % _escape(stats.key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, list(stats.buckets)):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append('dust_command_latency_ms_bucket{%s,le="%s"} %d' % (label, le, cumulative))
+            lines.append("dust_command_latency_ms_sum{%s} %f" % (label, stats.total_ms))
+            lines.append("dust_command_latency_ms_count{%s} %d" % (label, stats.calls))
+        lines.append("# TYPE dust_command_queries_total counter")
+        for stats in stats_list:
+            lines.append('dust_command_queries_total{command="%s"} %d' % (_escape(stats.key), stats.queries))
+    return "\n".join(lines) + "\n"
+
+
+set_perf_enabled(getattr(settings, "COMMAND_PERF_ENABLED", False))
@@ -0,0 +1,332 @@
+"""
+NPCs
+
+Helpers for the NPCs GMs create with @createnpc and order around with
+@npc. NPCs are slim Characters (typeclasses/npcs.py) with the
+`npc:true()` lock and an `edit` lock for the GM that made them.
+
+Orders given with @npc go into a queue on the GM (`ndb.npc_orders`) and
+are run in order. The NPCs of an order are found, and their `edit` lock
+checked, once when the order is given. A sequence can pause with
+"wait <seconds>" steps; everything between two waits is one batch, and
+the rooms the ordered NPCs are in hold their echoes until the batch is
+done (see `world.broadcast.hold_echoes`), so onlookers get a single
+message per batch instead of one per NPC action.
+
+NPCs nobody has ordered around or edited (with @npc or @char) for
+`NPC_ABANDON_DAYS` days are archived or deleted by the `NPCSweeperScript`
+(typeclasses/scripts.py), a chunk at a time; see `sweep_npcs`. When an
+NPC was last touched is kept as a Tag holding the day, so the sweeper
+finds abandoned NPCs with one query instead of loading every NPC.
+
+"""
+import re
+from collections import deque
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from evennia import create_object
+from evennia.objects.models import ObjectDB
+from evennia.prototypes import prototypes as protlib
+from evennia.prototypes.spawner import flatten_prototype
+from evennia.utils import logger
+from evennia.utils.utils import delay
+from world import behavior
+from world import presence
+from world.broadcast import hold_echoes, release_echoes
+
+NPC_TYPECLASS = "npcs.NPC"
+# the lock that marks an NPC, and the full lockstring @createnpc gives them
+NPC_LOCK = "npc:true()"
+NPC_LOCKS = "edit:id(%i) and perm(Builders);call:false();" + NPC_LOCK
+
+# Most NPCs one @createnpc may spawn.
+MAX_SPAWN = 50
+
+# Tag categories: the day an NPC was last touched, and archived NPCs.
+TOUCHED_CATEGORY = "npc_touched"
+ARCHIVE_CATEGORY = "npc"
+
+
+def find_template(name):
+    """
+    Find an NPC template: a prototype (see world/prototypes.py) by key.
+
+    Args:
+        name (str): The prototype key.
+
+    Returns:
+        prototype (dict or None): The prototype with its parents merged in.
+
+    """
+    found = protlib.search_prototype(key=name)
+    if len(found) != 1:
+        return None
+    return flatten_prototype(protlib.homogenize_prototype(found[0]))
+
+
+def numbered_names(base, count):
+    """
+    The next `count` free names of the form "<base> <n>", checked against
+    every object in the game with a single query.
+    """
+    pattern = re.compile(r"^%s (\d+)$" % re.escape(base), re.I)
+    highest = 0
+    for key in ObjectDB.objects.filter(db_key__istartswith=base + " ").values_list("db_key", flat=True):
+        match = pattern.match(key)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return ["%s %d" % (base, highest + i) for i in range(1, count + 1)]
+
+
+def spawn_npcs(prototype, count, location, creator):
+    """
+    Create many NPCs from one template in a single transaction. Each NPC's
+    Attributes go in with one bulk insert, as part of its creation.
+
+    Args:
+        prototype (dict): A template from `find_template`.
+        count (int): How many to create.
+        location (Object): Where to put them.
+        creator (Object): The GM, who gets to `edit` (and order) them.
+
+    Returns:
+        npcs (list): The new NPCs.
+
+    """
+    base = (prototype.get("key") or prototype["prototype_key"]).strip().capitalize()
+    typeclass = prototype.get("typeclass") or NPC_TYPECLASS
+    # attrs are (key, value, category, lockstring) tuples, like batch_add wants
+    attributes = [tuple(attr) for attr in prototype.get("attrs", ())]
+    tags = [tuple(tag) for tag in prototype.get("tags", ())]
+    locks = NPC_LOCKS % creator.id
+    npcs = []
+    with transaction.atomic():
+        for name in numbered_names(base, count):
+            npcs.append(create_object(typeclass, key=name, location=location, home=location,
+                                      locks=locks, tags=list(tags), attributes=list(attributes)))
+    return npcs
+
+
+def parse_sequence(text):
+    """
+    Split an order sequence into steps.
+
+    Args:
+        text (str): Actions separated by ";", like
+            "say Halt!; wait 2; emote draws a sword".
+
+    Returns:
+        steps (list): `("cmd", action)` and `("wait", seconds)` tuples.
+
+    """
+    steps = []
+    for part in text.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.match(r"^wait\s+(\d+(?:\.\d+)?)$", part, re.I)
+        if match:
+            steps.append(("wait", float(match.group(1))))
+        else:
+            steps.append(("cmd", part))
+    return steps
+
+
+def resolve_targets(gm, names):
+    """
+    Find the NPCs a GM means, once per order.
+
+    Args:
+        gm (Character): Who gives the order.
+        names (list): NPC names and names of the GM's NPC groups.
+
+    Returns:
+        allowed, refused (list, list): The NPCs the GM may order around
+            and the ones they may not, without duplicates.
+
+    """
+    groups = gm.get_attribute("npc_groups")
+    found = []
+    for name in names:
+        name = name.strip()
+        if name.lower() in groups:
+            # deleted NPCs come back as None
+            found.extend(npc for npc in groups[name.lower()] if npc)
+        elif name:
+            npc = gm.search(name)
+            if npc:
+                found.append(npc)
+    allowed, refused, seen = [], [], set()
+    for npc in found:
+        if npc in seen:
+            continue
+        seen.add(npc)
+        (allowed if npc.access(gm, "edit") else refused).append(npc)
+    return allowed, refused
+
+
+def queue_orders(gm, npcs, steps):
+    """
+    Add steps for some NPCs to the GM's order queue, and start running it
+    if it isn't already.
+    """
+    queue = gm.ndb.npc_orders
+    if queue is None:
+        queue = gm.ndb.npc_orders = deque()
+    queue.extend((npcs, step) for step in steps)
+    if not gm.ndb.npc_orders_waiting:
+        run_orders(gm)
+
+
+def clear_orders(gm):
+    """
+    Drop the orders that haven't run yet.
+
+    Returns:
+        dropped (int): How many actions and waits were dropped.
+
+    """
+    queue = gm.ndb.npc_orders or ()
+    dropped = len(queue)
+    gm.ndb.npc_orders = None
+    waiting = gm.ndb.npc_orders_waiting
+    gm.ndb.npc_orders_waiting = None
+    if waiting:
+        # swallow the CancelledError instead of logging it
+        waiting.addErrback(lambda failure: None)
+        waiting.cancel()
+    return dropped
+
+
+def _resume(gm):
+    gm.ndb.npc_orders_waiting = None
+    run_orders(gm)
+
+
+def run_orders(gm):
+    """
+    Run the GM's queued orders up to the next wait, as one batch.
+    """
+    queue = gm.ndb.npc_orders
+    held = []
+    try:
+        while queue:
+            npcs, (kind, value) = queue.popleft()
+            if kind == "wait":
+                gm.ndb.npc_orders_waiting = delay(value, _resume, gm)
+                return
+            for npc in npcs:
+                if not npc.pk:
+                    # deleted since the order was given
+                    continue
+                location = npc.location
+                if location and location not in held:
+                    hold_echoes(location)
+                    held.append(location)
+                touch(npc)
+                npc.execute_cmd(value)
+    finally:
+        for location in held:
+            release_echoes(location)
+
+
+def is_npc(obj):
+    """
+    Returns if `obj` was made with @createnpc.
+    """
+    return bool(obj.locks.get("npc"))
+
+
+def touch(npc):
+    """
+    Note that a GM used this NPC today, so the sweeper leaves it alone.
+    Writes at most once a day per NPC.
+    """
+    today = timezone.now().date().isoformat()
+    if npc.ndb.touched_day == today:
+        return
+    npc.ndb.touched_day = today
+    if not npc.tags.get(today, category=TOUCHED_CATEGORY):
+        npc.tags.clear(category=TOUCHED_CATEGORY)
+        npc.tags.add(today, category=TOUCHED_CATEGORY)
+
+
+def abandoned_npcs(days):
+    """
+    The NPCs nobody touched in `days` days and that aren't archived yet.
+
+    Returns:
+        queryset (QuerySet): The abandoned NPCs' ObjectDB rows.
+
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    # day tags sort like the days they name
+    recent = ObjectDB.objects.filter(db_tags__db_category=TOUCHED_CATEGORY,
+                                     db_tags__db_key__gte=cutoff.date().isoformat())
+    archived = ObjectDB.objects.filter(db_tags__db_category=ARCHIVE_CATEGORY,
+                                       db_tags__db_key="archived")
+    return ObjectDB.objects.filter(db_lock_storage__contains=NPC_LOCK, db_date_created__lt=cutoff) \
+        .exclude(id__in=recent.values("id")).exclude(id__in=archived.values("id"))
+
+
+def archive_npc(npc):
+    """
+    Take an NPC off the grid and out of the object cache, remembering
+    where it was. Archived NPCs are tagged "archived" (category "npc").
+    """
+    location = npc.location
+    if location:
+        npc.attributes.add("archived_location", location)
+        npc.location = None
+        presence.emit(location, "leave", npc)
+    npc.tags.add("archived", category=ARCHIVE_CATEGORY)
+    behavior.unschedule(npc)
+    npc.flush_from_cache()
+
+
+def sweep_npcs(days=None, action=None, chunk=None, callback=None):
+    """
+    Archive or delete every abandoned NPC, one chunk per transaction. The
+    chunks are spread over reactor turns so a big sweep doesn't stall the
+    game.
+
+    Args:
+        days (int, optional): How long an NPC must be untouched.
+            Defaults to `settings.NPC_ABANDON_DAYS`.
+        action (str, optional): "archive" or "delete". Defaults to
+            `settings.NPC_SWEEP_ACTION`.
+        chunk (int, optional): NPCs per transaction. Defaults to
+            `settings.NPC_SWEEP_CHUNK`.
+        callback (callable, optional): Called as `callback(counts)` when
+            done, with `{"archived", "deleted", "skipped"}` counts.
+
+    """
+    days = days or settings.NPC_ABANDON_DAYS
+    action = action or settings.NPC_SWEEP_ACTION
+    chunk = chunk or settings.NPC_SWEEP_CHUNK
+    ids = list(abandoned_npcs(days).values_list("id", flat=True))
+    counts = {"archived": 0, "deleted": 0, "skipped": 0}
+    _sweep_chunk(ids, action, chunk, counts, callback)
+
+
+def _sweep_chunk(ids, action, chunk, counts, callback):
+    batch, ids = ids[:chunk], ids[chunk:]
+    with transaction.atomic():
+        for npc in ObjectDB.objects.filter(id__in=batch):
+            if npc.sessions.count():
+                # someone is puppeting it after all
+                counts["skipped"] += 1
+            elif action == "delete":
+                npc.delete()
+                counts["deleted"] += 1
+            else:
+                archive_npc(npc)
+                counts["archived"] += 1
+    if ids:
+        delay(0, _sweep_chunk, ids, action, chunk, counts, callback)
+        return
+    logger.log_info("NPC sweep: %(archived)i archived, %(deleted)i deleted, %(skipped)i skipped." % counts)
+    if callback:
+        callback(counts)
@@ -0,0 +1,91 @@
+"""
+Presence
+
+A stream of small room-presence events for clients that show a live
+panel of who is in the room, so they don't have to re-request and
+re-render the whole room on every arrival.
+
+Every event is sent out-of-band to the sessions of everyone in the
+room as
+
+    ["presence", [], {"room": <id>, "epoch": <epoch>, "seq": <seq>,
+                      "event": <event>, "occupant": {"id", "name", "pose", "awake"}}]
+
+where event is one of "enter", "leave", "pose", "awake" or "asleep".
+`seq` goes up by one for every event in a room. A client that sees a
+gap in `seq`, or a different `epoch` (sequences restart when the
+server reloads), should ask for a fresh snapshot with the
+`presence_sync` inputfunc (see server/conf/inputfuncs.py).
+
+In rooms that coalesce or hold their echoes, events are queued with the
+echoes (see world/broadcast.py), so they arrive in order with them.
+
+"""
+import time
+from world import metrics
+from world.broadcast import buffer_echo, is_coalescing
+
+# Changes every server (re)start, so clients can tell sequences apart.
+EPOCH = int(time.time())
+
+
+def occupant_info(obj):
+    """
+    The presence entry for one occupant.
+    """
+    return {"id": obj.id, "name": obj.key, "pose": obj.get_pose(),
+            "awake": bool(obj.sessions.count())}
+
+
+def next_seq(room):
+    """
+    Bump and return the room's event sequence number.
+    """
+    seq = (room.ndb.presence_seq or 0) + 1
+    room.ndb.presence_seq = seq
+    return seq
+
+
+def emit(room, event, obj):
+    """
+    Send a presence event to everyone listening in a room.
+
+    Args:
+        room (Object): The room the event happened in. Nothing happens if `None`.
+        event (str): "enter", "leave", "pose", "awake" or "asleep".
+        obj (Character): Who entered, left or changed.
+
+    Returns:
+        seq (int or None): The event's sequence number.
+
+    """
+    if not room:
+        return None
+    payload = {"room": room.id, "epoch": EPOCH, "seq": next_seq(room), "event": event,
+               "occupant": occupant_info(obj)}
+    coalesce = is_coalescing(room)
+    for listener in room.contents:
+        if not listener.sessions.count():
+            continue
+        if coalesce:
+            buffer_echo(room, listener, None, None, presence=((), payload))
+        else:
+            listener.msg(presence=((), payload))
+            metrics.incr("messages_sent")
+    return payload["seq"]
+
+
+def snapshot(room):
+    """
+    Everything a client needs to (re)build its occupant panel.
+
+    Args:
+        room (Object): The room.
+
+    Returns:
+        snapshot (dict): `{"room", "epoch", "seq", "occupants"}`. Events
+            with a higher `seq` than this come after the snapshot.
+
+    """
+    return {"room": room.id, "epoch": EPOCH, "seq": room.ndb.presence_seq or 0,
+            "occupants": [occupant_info(con) for con in room.contents if hasattr(con, "get_pose")]}
@@ -71,3 +71,14 @@ See the `@spawn` command and `evennia.utils.spawner` for more info.
 # "key": "goblin archwizard",
 # "prototype_parent" : ("GOBLIN_WIZARD", "ARCHWIZARD_MIXIN")
 # }
+
+# NPC templates for `@createnpc <count> <template>`. Plain keywords
+# become Attributes on every NPC spawned, like for @spawn.
+
+EXTRA = {
+    "prototype_key": "extra",
+    "prototype_desc": "A background extra for crowd scenes.",
+    "key": "Extra",
+    "typeclass": "typeclasses.npcs.NPC",
+    "desc": "Someone in the crowd.",
+}
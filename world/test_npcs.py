@@ -0,0 +1,55 @@
+"""
+Tests for the NPC sweeper in world/npcs.py.
+
+Run with `evennia test --settings settings.py .` from the game dir.
+
+"""
+from datetime import timedelta
+from django.utils import timezone
+from evennia import create_object
+from evennia.objects.models import ObjectDB
+from evennia.utils.test_resources import EvenniaTest
+
+from world import npcs
+
+
+class TestNPCSweeper(EvenniaTest):
+    def setUp(self):
+        super().setUp()
+        self.old = self.create_npc("Old")
+        self.recent = self.create_npc("Recent")
+        # both were made long ago, but a GM used the recent one today
+        ObjectDB.objects.filter(id__in=(self.old.id, self.recent.id)) \
+            .update(db_date_created=timezone.now() - timedelta(days=60))
+        npcs.touch(self.recent)
+
+    def create_npc(self, key):
+        return create_object(npcs.NPC_TYPECLASS, key=key, location=self.room1,
+                             locks=npcs.NPC_LOCKS % self.char1.id)
+
+    def sweep(self, action):
+        counts = []
+        npcs.sweep_npcs(days=30, action=action, callback=counts.append)
+        return counts[0]
+
+    def test_abandoned_npcs(self):
+        self.assertEqual(list(npcs.abandoned_npcs(30).values_list("id", flat=True)), [self.old.id])
+
+    def test_new_npc_is_not_abandoned(self):
+        new = self.create_npc("New")
+        self.assertNotIn(new.id, npcs.abandoned_npcs(30).values_list("id", flat=True))
+
+    def test_sweep_archives(self):
+        self.assertEqual(self.sweep("archive"), {"archived": 1, "deleted": 0, "skipped": 0})
+        old = ObjectDB.objects.get(id=self.old.id)
+        self.assertTrue(old.tags.get("archived", category=npcs.ARCHIVE_CATEGORY))
+        self.assertIsNone(old.location)
+        self.assertEqual(old.attributes.get("archived_location"), self.room1)
+        self.assertEqual(self.recent.location, self.room1)
+        # archived NPCs aren't swept again
+        self.assertFalse(npcs.abandoned_npcs(30).exists())
+
+    def test_sweep_deletes(self):
+        self.assertEqual(self.sweep("delete"), {"archived": 0, "deleted": 1, "skipped": 0})
+        self.assertFalse(ObjectDB.objects.filter(id=self.old.id).exists())
+        self.assertTrue(ObjectDB.objects.filter(id=self.recent.id).exists())
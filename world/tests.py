@@ -0,0 +1,86 @@
+"""
+Tests for the world modules.
+
+Run with `evennia test --settings settings.py .` from the game dir.
+These ones don't need the database, so `python -m unittest world.tests`
+works too.
+
+"""
+from unittest import TestCase
+
+from world.timingwheel import TimingWheel
+
+
+class TestTimingWheel(TestCase):
+    def setUp(self):
+        self.wheel = TimingWheel(size=8, tick=5)
+
+    def advance(self, ticks):
+        expired = []
+        for _ in range(ticks):
+            expired.extend(self.wheel.advance())
+        return expired
+
+    def test_expires_after_delay(self):
+        self.wheel.add("a", 15, "value")
+        self.assertEqual(self.advance(2), [])
+        self.assertEqual(self.wheel.advance(), [("a", "value")])
+        self.assertNotIn("a", self.wheel)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_delay_rounds_up_to_whole_ticks(self):
+        self.wheel.add("a", 11)
+        self.wheel.add("b", 0)
+        # 11 seconds is 3 ticks, and 0 is still one
+        self.assertEqual(self.wheel.advance(), [("b", None)])
+        self.assertEqual(self.wheel.advance(), [])
+        self.assertEqual(self.wheel.advance(), [("a", None)])
+
+    def test_expires_after_several_turns(self):
+        # 20 ticks on an 8 slot wheel
+        self.wheel.add("a", 100)
+        self.assertEqual(self.advance(19), [])
+        self.assertEqual(self.wheel.advance(), [("a", None)])
+
+    def test_add_replaces_earlier_schedule(self):
+        self.wheel.add("a", 5, 1)
+        self.wheel.add("a", 10, 2)
+        self.assertEqual(len(self.wheel), 1)
+        self.assertEqual(self.wheel.advance(), [])
+        self.assertEqual(self.wheel.advance(), [("a", 2)])
+
+    def test_remove(self):
+        self.wheel.add("a", 5, "value")
+        self.assertEqual(self.wheel.remove("a"), "value")
+        self.assertIsNone(self.wheel.remove("a"))
+        self.assertEqual(self.advance(10), [])
+
+    def test_remaining(self):
+        self.assertIsNone(self.wheel.remaining("a"))
+        self.wheel.add("a", 100)
+        self.assertEqual(self.wheel.remaining("a"), 100)
+        self.advance(9)
+        self.assertEqual(self.wheel.remaining("a"), 55)
+        self.advance(10)
+        self.assertEqual(self.wheel.remaining("a"), 5)
+
+    def test_snapshot_restore(self):
+        self.wheel.add("a", 100, "x")
+        self.wheel.add("b", 20)
+        self.advance(2)
+        snapshot = self.wheel.snapshot()
+        self.assertEqual(sorted(snapshot), [("a", 90, "x"), ("b", 10, None)])
+
+        # onto a wheel of another size, 5 seconds later
+        wheel = TimingWheel(size=3, tick=5)
+        wheel.restore(snapshot, elapsed=5)
+        self.assertEqual(wheel.remaining("a"), 85)
+        self.assertEqual(wheel.advance(), [("b", None)])
+        expired = []
+        for _ in range(16):
+            expired.extend(wheel.advance())
+        self.assertEqual(expired, [("a", "x")])
+
+    def test_restore_overdue_expires_next_tick(self):
+        self.wheel.restore([("a", 10, None)], elapsed=60)
+        self.assertEqual(self.wheel.advance(), [("a", None)])
@@ -0,0 +1,118 @@
+"""
+Timing wheel
+
+A hashed timing wheel: a ring of slots, one per tick, that the owner
+advances once per tick. An entry due in `n` ticks goes into the slot
+`n` ahead of the current one, with a count of how many full turns of
+the wheel to wait first. Adding, removing and expiring an entry are
+all O(1), however many entries there are, so one wheel advanced by one
+Script can stand in for thousands of separate timers.
+
+    wheel = TimingWheel(size=64, tick=5)
+    wheel.add(npc.id, 60)         # due in 60 seconds (12 ticks)
+    for key, value in wheel.advance():   # every 5 seconds
+        ...
+
+"""
+
+
+class TimingWheel(object):
+    """
+    Entries keyed by any hashable, each with an optional value.
+
+    Attributes:
+        size (int): Slots in the ring.
+        tick (float): Seconds per slot.
+
+    """
+
+    __slots__ = ("size", "tick", "position", "slots", "entries")
+
+    def __init__(self, size=256, tick=1.0):
+        self.size = size
+        self.tick = tick
+        self.position = 0
+        self.slots = [set() for _ in range(size)]
+        # {key: (slot, rounds, value)}
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, key, delay, value=None):
+        """
+        Schedule `key` to expire after `delay` seconds, replacing any
+        earlier schedule for it. Delays are rounded up to whole ticks, and
+        are at least one tick.
+        """
+        self.remove(key)
+        ticks = max(1, int(-(-delay // self.tick)))
+        rounds, offset = divmod(ticks - 1, self.size)
+        slot = (self.position + offset + 1) % self.size
+        self.slots[slot].add(key)
+        self.entries[key] = (slot, rounds, value)
+
+    def remove(self, key):
+        """
+        Unschedule `key`. Returns its value, or None if it wasn't scheduled.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.slots[entry[0]].discard(key)
+        return entry[2]
+
+    def advance(self):
+        """
+        Move on one tick.
+
+        Returns:
+            expired (list): `(key, value)` for every entry that expired.
+
+        """
+        self.position = (self.position + 1) % self.size
+        slot = self.slots[self.position]
+        expired = []
+        for key in list(slot):
+            _, rounds, value = self.entries[key]
+            if rounds:
+                self.entries[key] = (self.position, rounds - 1, value)
+            else:
+                slot.discard(key)
+                del self.entries[key]
+                expired.append((key, value))
+        return expired
+
+    def remaining(self, key):
+        """
+        Seconds until `key` expires, or None if it isn't scheduled.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        slot, rounds, _ = entry
+        ticks = (slot - self.position - 1) % self.size + 1 + rounds * self.size
+        return ticks * self.tick
+
+    def snapshot(self):
+        """
+        A compact, picklable copy of the schedule: `[(key, seconds, value), ...]`.
+        Give it to `restore` (on a wheel of any size) to continue.
+        """
+        return [(key, self.remaining(key), entry[2]) for key, entry in self.entries.items()]
+
+    def restore(self, snapshot, elapsed=0):
+        """
+        Re-add the entries of a `snapshot`.
+
+        Args:
+            snapshot (list): From `snapshot`.
+            elapsed (float, optional): Seconds since the snapshot was taken.
+                Entries that are overdue expire on the next tick.
+
+        """
+        for key, seconds, value in snapshot:
+            self.add(key, seconds - elapsed, value)
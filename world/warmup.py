@@ -0,0 +1,158 @@
+"""
+Warmup
+
+Keeps the first looks after a restart from paying the whole cold-path
+cost.
+
+At every server start, `preload` loads the characters of recently
+active accounts with one query and reads their wardrobe, nakeds and
+poses, which fills their Attribute caches.
+
+On reload, `save_snapshot` writes the rendered appearance caches
+(world/appearance.py) and room headers (`Room.get_header`) to
+`SNAPSHOT_FILE`, and `restore_snapshot` puts them back after the
+restart. Nothing is restored if the snapshot has a different format,
+if the rendering code changed since it was taken (see `code_stamp`), or
+if it is too old. Each character's entry is also only used if its
+wardrobe version still matches. The file is removed once read.
+
+"""
+import json
+import os
+import time
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from evennia.accounts.models import AccountDB
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+
+SNAPSHOT_FILE = os.path.join(settings.GAME_DIR, "server", "cache_snapshot.json")
+SNAPSHOT_FORMAT = 1
+# Snapshots older than this (in seconds) are ignored.
+SNAPSHOT_MAX_AGE = 600
+
+# Modules the cached texts are rendered by.
+RENDER_MODULES = ("world/appearance.py", "world/bodyplans.py", "config/configlists.py",
+                  "typeclasses/characters.py", "typeclasses/rooms.py")
+
+
+def code_stamp():
+    """
+    Checksum of the rendering code, so caches made by old code are not restored.
+    """
+    stamp = 0
+    for path in RENDER_MODULES:
+        with open(os.path.join(settings.GAME_DIR, path), "rb") as module:
+            stamp = zlib.crc32(module.read(), stamp)
+    return stamp
+
+
+def recent_character_ids(days):
+    """
+    Ids of the characters of accounts that logged in in the last `days` days.
+    """
+    ids = set()
+    cutoff = timezone.now() - timedelta(days=days)
+    for account in AccountDB.objects.filter(last_login__gte=cutoff):
+        for character in account.db._playable_characters or ():
+            if character:
+                ids.add(character.id)
+    return ids
+
+
+def preload(days=None):
+    """
+    Load recently active characters and their wardrobe, nakeds and poses.
+
+    Returns:
+        loaded (int): How many characters were loaded.
+
+    """
+    ids = recent_character_ids(days or settings.CACHE_WARM_DAYS)
+    loaded = 0
+    for character in ObjectDB.objects.filter(id__in=ids):
+        if not hasattr(character, "get_wardrobe_version"):
+            continue
+        character.get_wardrobe_version()
+        character.get_nakeds()
+        character.get_worn()
+        character.get_pose()
+        loaded += 1
+    return loaded
+
+
+def save_snapshot():
+    """
+    Write the appearance caches and room headers of every object in
+    memory to `SNAPSHOT_FILE`.
+
+    Returns:
+        saved (int): How many objects had something to save.
+
+    """
+    characters, rooms = {}, {}
+    for obj in ObjectDB.get_all_cached_instances():
+        text = obj.ndb.appearance_cache
+        payload = obj.ndb.appearance_payload_cache
+        if text or payload:
+            characters[obj.id] = {"text": text, "payload": payload}
+        if obj.ndb.header_signature:
+            rooms[obj.id] = {"signature": obj.ndb.header_signature, "header": obj.ndb.header}
+    snapshot = {"format": SNAPSHOT_FORMAT, "code": code_stamp(), "time": time.time(),
+                "characters": characters, "rooms": rooms}
+    tmpname = SNAPSHOT_FILE + ".tmp"
+    with open(tmpname, "w") as tmpfile:
+        json.dump(snapshot, tmpfile)
+    os.replace(tmpname, SNAPSHOT_FILE)
+    return len(characters) + len(rooms)
+
+
+def _load_snapshot():
+    try:
+        with open(SNAPSHOT_FILE) as snapfile:
+            snapshot = json.load(snapfile)
+    except (OSError, ValueError):
+        return None
+    finally:
+        if os.path.exists(SNAPSHOT_FILE):
+            os.remove(SNAPSHOT_FILE)
+    if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("code") != code_stamp():
+        return None
+    if time.time() - snapshot.get("time", 0) > SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
+
+
+def restore_snapshot():
+    """
+    Put back the caches from `save_snapshot`, where still valid.
+
+    Returns:
+        restored (int): How many objects got caches back.
+
+    """
+    snapshot = _load_snapshot()
+    if not snapshot:
+        return 0
+    characters, rooms = snapshot["characters"], snapshot["rooms"]
+    ids = [int(objid) for objid in characters] + [int(objid) for objid in rooms]
+    restored = 0
+    for obj in ObjectDB.objects.filter(id__in=ids):
+        key = str(obj.id)
+        if key in characters and hasattr(obj, "get_wardrobe_version"):
+            version = obj.get_wardrobe_version()
+            text, payload = characters[key]["text"], characters[key]["payload"]
+            if text and text[0] == version:
+                obj.ndb.appearance_cache = tuple(text)
+            if payload and payload[0] == version:
+                obj.ndb.appearance_payload_cache = tuple(payload)
+            restored += 1
+        if key in rooms:
+            # get_header checks the signature against the room as it is now
+            obj.ndb.header_signature = tuple(rooms[key]["signature"])
+            obj.ndb.header = rooms[key]["header"]
+            restored += 1
+    logger.log_info("Restored cached appearances of %i objects." % restored)
+    return restored